@@ -0,0 +1,114 @@
+"""
+Batch analysis: best move, score and principal variation for many positions.
+
+    for fen, best, score, pv, nodes in analyse_positions(fens, depth=4, workers=4):
+        ...
+
+Positions are searched one after another with the same engine, so the
+transposition table, killers and history carry over between them (the table
+is aged, not cleared). With workers > 1 they are dealt to a process pool and
+every worker keeps its own tables across the positions it is given.
+
+Workers search with the given engine's settings: table size and file,
+and search feature switches. To reuse results between runs, keep the
+table in a file with ``minimax.open_tt_file(path, engine=engine)``; the
+workers then open the same file.
+"""
+import threading
+from collections import deque
+from itertools import repeat
+
+from bitboard import WHITE, BLACK
+from board import Board
+from minimax import (
+    engine, load_fen, load_board, iterative_deepening, move_to_uci, get_pool, worker_settings, apply_settings,
+)
+
+
+def analyse_positions(positions, depth=4, time_limit=None, workers=1, chunksize=16, engine=engine):
+    """
+    Analyses an iterable of positions, yielding ``(position, best_move, score, pv, nodes)``
+    for each in input order as soon as it is done.
+
+    A position is a FEN string, a Board, or a ``(board, next_player)`` pair; a
+    bare Board is analysed for the side that did not play ``board.last_move``.
+    depth and time_limit are either one value for every position or iterables
+    giving a budget per position. Moves are in long algebraic notation (e2e4)
+    and score is in centipawns for the side to move (mates are near +-INF);
+    best_move is None when the position has no legal moves. Without workers
+    the searches run on the given EngineState.
+    """
+    depths = repeat(depth) if isinstance(depth, int) else iter(depth)
+    time_limits = repeat(time_limit) if time_limit is None or isinstance(time_limit, (int, float)) else iter(time_limit)
+    budgets = zip(positions, depths, time_limits)
+
+    if workers <= 1:
+        for position, d, t in budgets:
+            yield (position,) + analyse(position, d, t, engine)
+        return
+
+    # Only picklable FEN strings go to the workers; the inputs are matched back up by order.
+    items = deque()
+    settings = worker_settings(engine)
+    # The pool's feeder thread drains its input as fast as it can; this keeps it
+    # at most a few chunks per worker ahead of the results handed out.
+    window = threading.Semaphore(2 * workers * chunksize)
+    closed = False
+
+    def tasks():
+        for position, d, t in budgets:
+            window.acquire()
+            if closed:
+                return
+            items.append(position)
+            yield position_fen(position), d, t, settings
+
+    try:
+        for result in get_pool(workers).imap(_analyse_worker, tasks(), chunksize):
+            window.release()
+            yield (items.popleft(),) + result
+    finally:
+        # let a feeder waiting for room see that nobody is reading any more
+        closed = True
+        window.release()
+
+
+def analyse(position, depth, time_limit=None, engine=engine):
+    """Searches one position; returns ``(best_move, score, pv, nodes)``."""
+    engine.reset(time_limit=time_limit)
+    engine.tt.new_search()
+    if isinstance(position, str):
+        pos, colour = load_fen(position, engine)
+    else:
+        board, next_player = position_board(position)
+        colour = WHITE if next_player == 'white' else BLACK
+        pos = load_board(board, colour, engine)
+
+    results = iterative_deepening(pos, colour, depth, engine=engine)
+    if not results:
+        return None, 0, [], engine.nodes
+    _, score, move = results[-1]
+    return move_to_uci(move), score, [move_to_uci(m) for m in engine.pv], engine.nodes
+
+
+def position_board(position):
+    if isinstance(position, Board):
+        if position.next_player is not None:
+            return position, position.next_player
+        last = position.last_move
+        mover = position.squares[last.final.row][last.final.col].piece if last else None
+        return position, 'white' if mover is None or mover.colour == 'black' else 'black'
+    return position
+
+
+def position_fen(position):
+    if isinstance(position, str):
+        return position
+    board, next_player = position_board(position)
+    return board.fen(next_player)
+
+
+def _analyse_worker(task):
+    fen, depth, time_limit, settings = task
+    apply_settings(settings)
+    return analyse(fen, depth, time_limit)
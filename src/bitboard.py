@@ -0,0 +1,227 @@
+from const import ROWS, COLS
+from piece import Pawn, Knight, Bishop, Rook, Queen, King
+
+# ---------------------------------------------------------------------------
+# Squares, colours and piece codes
+# ---------------------------------------------------------------------------
+# Square index is row * 8 + col, the same layout as Board.squares, so bit 0 is
+# a8 and bit 63 is h1. White pawns therefore move towards lower indices.
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = -1
+
+COLOUR_NAMES = ('white', 'black')
+PIECE_NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_A = FULL ^ FILE_A
+NOT_H = FULL ^ FILE_H
+NOT_AB = FULL ^ (FILE_A | FILE_B)
+NOT_GH = FULL ^ (FILE_G | FILE_H)
+
+# Castling right bits: 1/2 white king/queen side, 4/8 black king/queen side.
+ROOK_CASTLING_BITS = {63: 1, 56: 2, 7: 4, 0: 8}
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# FEN letter of every piece code, white pawn..king then black pawn..king.
+FEN_PIECES = 'PNBRQKpnbrqk'
+FEN_CODES = {ch: code for code, ch in enumerate(FEN_PIECES)}
+CASTLING_CHARS = (('K', 1), ('Q', 2), ('k', 4), ('q', 8))
+
+
+def square(row, col):
+    return row * 8 + col
+
+
+def piece_code(colour, kind):
+    """Index into Position.pieces: white pawn..king are 0-5, black 6-11."""
+    return colour * 6 + kind
+
+
+def iter_bits(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def square_name(sq):
+    """Algebraic name of a square, e.g. 0 -> 'a8', 63 -> 'h1'."""
+    return 'abcdefgh'[sq & 7] + str(8 - (sq >> 3))
+
+
+def parse_square(name):
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f'bad square {name!r}')
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
+
+
+def parse_fen(fen):
+    """
+    Parses a FEN string.
+
+    Returns ``(pos, colour, castling_rights, ep_square, halfmove, fullmove)``.
+    The move counters may be left out and default to 0 and 1. Castling rights
+    whose king or rook is not on its home square are dropped, and so is an en
+    passant square that no double pawn push can have left behind. Raises
+    ValueError on malformed input.
+    """
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f'bad FEN {fen!r}')
+    placement, side, castling, ep = fields[:4]
+
+    pos = Position()
+    pieces = pos.pieces
+    mailbox = pos.mailbox
+    sq = 0
+    for ch in placement:
+        if ch == '/':
+            if sq & 7:
+                raise ValueError(f'bad FEN rank in {fen!r}')
+        elif ch in '12345678':
+            sq += int(ch)
+        else:
+            code = FEN_CODES.get(ch)
+            if code is None or sq >= 64:
+                raise ValueError(f'bad FEN placement {placement!r}')
+            pieces[code] |= 1 << sq
+            mailbox[sq] = code
+            sq += 1
+    if sq != 64:
+        raise ValueError(f'bad FEN placement {placement!r}')
+    pos.colours[WHITE] = pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5]
+    pos.colours[BLACK] = pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]
+    pos.occupied = pos.colours[WHITE] | pos.colours[BLACK]
+    if not pos.pieces[KING] or not pos.pieces[6 + KING]:
+        raise ValueError(f'FEN needs both kings: {fen!r}')
+
+    if side not in ('w', 'b'):
+        raise ValueError(f'bad FEN side to move {side!r}')
+    colour = WHITE if side == 'w' else BLACK
+
+    rights = 0
+    if castling != '-':
+        for ch, bit in CASTLING_CHARS:
+            if ch in castling:
+                rights |= bit
+    for rook_sq, bit in ROOK_CASTLING_BITS.items():
+        king_code = KING if bit < 4 else 6 + KING
+        rook_code = ROOK if bit < 4 else 6 + ROOK
+        if pos.mailbox[rook_sq] != rook_code or pos.mailbox[60 if bit < 4 else 4] != king_code:
+            rights &= ~bit
+
+    ep_square = None if ep == '-' else parse_square(ep)
+    if ep_square is not None:
+        # the pushed enemy pawn stands in front of the square, which it and the
+        # square it started from left empty
+        row = 2 if colour == WHITE else 5
+        pawn = ep_square + (8 if colour == WHITE else -8)
+        start = ep_square - (8 if colour == WHITE else -8)
+        if (ep_square >> 3 != row or mailbox[pawn] != piece_code(colour ^ 1, PAWN)
+                or mailbox[ep_square] != EMPTY or mailbox[start] != EMPTY):
+            ep_square = None
+    halfmove = int(fields[4]) if len(fields) > 4 else 0
+    fullmove = int(fields[5]) if len(fields) > 5 else 1
+    return pos, colour, rights, ep_square, halfmove, fullmove
+
+
+def to_fen(pos, colour, castling_rights=0, ep_square=None, halfmove=0, fullmove=1):
+    ranks = []
+    for row in range(8):
+        rank = ''
+        empty = 0
+        for code in pos.mailbox[row * 8:row * 8 + 8]:
+            if code == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += FEN_PIECES[code]
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    castling = ''.join(ch for ch, bit in CASTLING_CHARS if castling_rights & bit) or '-'
+    ep = square_name(ep_square) if ep_square is not None else '-'
+    side = 'w' if colour == WHITE else 'b'
+    return f"{'/'.join(ranks)} {side} {castling} {ep} {halfmove} {fullmove}"
+
+
+# ---------------------------------------------------------------------------
+# Position
+# ---------------------------------------------------------------------------
+class Position:
+    """
+    Piece placement as one 64-bit integer per piece type and colour.
+
+    ``colours`` holds the occupancy of each side and ``occupied`` the union of
+    both. ``mailbox`` mirrors the bitboards as a flat list of piece codes so the
+    piece on a given square can be read without scanning twelve bitboards.
+    Side to move, castling rights and the en passant square are search state
+    and live on ``minimax.EngineState``.
+    """
+
+    __slots__ = ('pieces', 'colours', 'occupied', 'mailbox')
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.colours = [0, 0]
+        self.occupied = 0
+        self.mailbox = [EMPTY] * 64
+
+    def put(self, sq, code):
+        bit = 1 << sq
+        self.pieces[code] |= bit
+        self.colours[code // 6] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = code
+
+    def remove(self, sq):
+        code = self.mailbox[sq]
+        bit = 1 << sq
+        self.pieces[code] ^= bit
+        self.colours[code // 6] ^= bit
+        self.occupied ^= bit
+        self.mailbox[sq] = EMPTY
+        return code
+
+    def piece_at(self, sq):
+        return self.mailbox[sq]
+
+    def king_square(self, colour):
+        return self.pieces[colour * 6 + KING].bit_length() - 1
+
+    def copy(self):
+        pos = Position()
+        pos.pieces = self.pieces[:]
+        pos.colours = self.colours[:]
+        pos.occupied = self.occupied
+        pos.mailbox = self.mailbox[:]
+        return pos
+
+    @classmethod
+    def from_pieces(cls, pieces):
+        """Rebuilds a position from its twelve piece bitboards."""
+        pos = cls()
+        for code, bb in enumerate(pieces):
+            for sq in iter_bits(bb):
+                pos.put(sq, code)
+        return pos
+
+    @classmethod
+    def from_board(cls, board):
+        pos = cls()
+        for row in range(ROWS):
+            row_squares = board.squares[row]
+            for col in range(COLS):
+                p = row_squares[col].piece
+                if p:
+                    colour = WHITE if p.colour == 'white' else BLACK
+                    pos.put(row * 8 + col, piece_code(colour, PIECE_NAMES.index(p.name)))
+        return pos
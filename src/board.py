@@ -1,10 +1,15 @@
-import copy
-import os
 from const import *
 from move import Move
 from square import Square
 from piece import *
-from sound import Sound
+from bitboard import (
+    Position, WHITE, BLACK, PAWN, ROOK, KING, EMPTY, COLOUR_NAMES, PIECE_NAMES, PIECE_CLASSES, ROOK_CASTLING_BITS,
+    parse_fen, to_fen,
+)
+from minimax import (
+    QUEEN, load_board, get_legal_moves, generate_pseudo_moves, move_promotion,
+    detect_castling_rights, detect_en_passant,
+)
 
 
 class Board:
@@ -12,16 +17,77 @@ class Board:
         self.last_moves = None
         self.squares = [[0 for _ in range(ROWS)] for _ in range(COLS)]
         self.last_move = None
+        # side to move, None when set_position was not told
+        self.next_player = 'white'
+        # FEN move counters
+        self.halfmove = 0
+        self.fullmove = 1
         self._create()
         self._add_piece('white')
         self._add_piece('black')
 
-    def move(self, piece, move, testing=False):
+    def set_fen(self, fen):
+        """
+        Replaces the position with the one in a FEN string.
+        :return: the side to move, 'white' or 'black'
+        """
+        pos, colour, castling_rights, ep_square, self.halfmove, self.fullmove = parse_fen(fen)
+        self.set_position(pos, castling_rights, ep_square, COLOUR_NAMES[colour])
+        return self.next_player
+
+    def fen(self, next_player='white'):
+        colour = WHITE if next_player == 'white' else BLACK
+        return to_fen(Position.from_board(self), colour, detect_castling_rights(self),
+                      detect_en_passant(self, colour), self.halfmove, self.fullmove)
+
+    def set_position(self, pos, castling_rights=0, ep_square=None, next_player=None):
+        """
+        Fills the squares from an engine Position.
+        Castling rights become the moved flags of kings and rooks, and the pawn that
+        can be taken en passant gets its en_passant flag. next_player, 'white' or
+        'black', is kept as the side to move.
+        """
+        mailbox = pos.mailbox
+        for row in range(ROWS):
+            row_squares = self.squares[row]
+            for col in range(COLS):
+                code = mailbox[row * 8 + col]
+                if code == EMPTY:
+                    row_squares[col].piece = None
+                    continue
+                colour, kind = COLOUR_NAMES[code // 6], code % 6
+                piece = PIECE_CLASSES[kind](colour)
+                if kind == PAWN:
+                    piece.moved = row != (6 if colour == 'white' else 1)
+                elif kind == KING:
+                    piece.moved = not castling_rights & (3 if colour == 'white' else 12)
+                elif kind == ROOK:
+                    piece.moved = not castling_rights & ROOK_CASTLING_BITS.get(row * 8 + col, 0)
+                row_squares[col].piece = piece
+
+        if ep_square is not None:
+            pawn_row = ep_square // 8 + (1 if ep_square // 8 == 2 else -1)
+            pawn = self.squares[pawn_row][ep_square % 8].piece
+            if isinstance(pawn, Pawn):
+                pawn.en_passant = True
+        self.last_move = None
+        self.next_player = next_player
+
+    def move(self, piece, move):
+        """
+        Plays move on the board.
+        :return: whether it captured a piece, en passant included
+        """
         initial = move.initial
         final = move.final
 
         en_passant_empty = self.squares[final.row][final.col].isempty()
 
+        # FEN counters: captures and pawn moves reset the fifty-move clock
+        self.halfmove = 0 if isinstance(piece, Pawn) or not en_passant_empty else self.halfmove + 1
+        if piece.colour == 'black':
+            self.fullmove += 1
+
         # board move update
         self.squares[initial.row][initial.col].piece = None
         self.squares[final.row][final.col].piece = piece
@@ -33,15 +99,13 @@ class Board:
             if diff != 0 and en_passant_empty:
                 self.squares[initial.row][initial.col + diff].piece = None
                 self.squares[final.row][final.col].piece = piece
-                if not testing:
-                    sound = Sound(os.path.join('assets/sounds/capture.wav'))
-                    sound.play()
+                en_passant_empty = False
 
             # en passant
             # print('2 sq moved')
             # promotion
             else:
-                self.check_promotion(piece, final)
+                self.check_promotion(piece, final, move.promotion or 'queen')
 
         # castling
         if isinstance(piece, King) and self.castle(initial, final):
@@ -58,6 +122,8 @@ class Board:
         piece.moved = True
         piece.clear_moves()
         self.last_move = move
+        self.next_player = 'black' if piece.colour == 'white' else 'white'
+        return not en_passant_empty
 
     @staticmethod
     def valid_move(piece, move):
@@ -67,256 +133,28 @@ class Board:
     def castle(initial, final):
         return abs(initial.col - final.col) == 2
 
-    def in_check(self, piece, move):
-        temp_piece = copy.deepcopy(piece)
-        temp_board = copy.deepcopy(self)
-        try:
-            temp_board.move(temp_piece, move, testing=True)
-        except IndexError:
-            pass
-
-        for row in range(ROWS):
-            for col in range(COLS):
-                if temp_board.squares[row][col].has_enemy_piece(piece.colour):
-                    p = temp_board.squares[row][col].piece
-                    temp_board.calc_moves(p, row, col, False)
-                    for m in p.moves:
-                        if isinstance(m.final.piece, King):
-                            return True
-        return False
-
     def calc_moves(self, piece, row: int, col: int, bl: bool = True):
 
         """
-        Calculates all possible moves for a piece
-        :param bl:
+        Calculates all possible moves for a piece, using the engine's move generator
+        :param bl: legal moves only; False also keeps moves that leave the king in check
         :param piece:
         :param row:
         :param col:
         """
+        colour = WHITE if piece.colour == 'white' else BLACK
+        pos = load_board(self, colour)
+        keys = get_legal_moves(pos, colour) if bl else generate_pseudo_moves(pos, colour)
 
-        def straight_line_moves(incs):
-            for inc in incs:
-                row_inc, col_inc = inc
-                possible_move_row = row + row_inc
-                possible_move_col = col + col_inc
-
-                while True:
-                    if Square.in_range(possible_move_row, possible_move_col):
-                        initial = Square(row, col)
-                        final_piece = self.squares[possible_move_row][possible_move_col].piece
-                        final = Square(possible_move_row, possible_move_col, final_piece)
-                        move = Move(initial, final)
-                        if self.squares[possible_move_row][possible_move_col].isempty():
-                            # check fo checks
-                            if bl:
-                                if not self.in_check(piece, move):
-                                    piece.add_move(move)
-                            else:
-                                piece.add_move(move)
-
-                        elif self.squares[possible_move_row][possible_move_col].has_enemy_piece(piece.colour):
-                            # check fo checks
-                            if bl:
-                                if not self.in_check(piece, move):
-                                    piece.add_move(move)
-                            else:
-                                piece.add_move(move)
-                            break
-                        elif self.squares[possible_move_row][possible_move_col].has_team_piece(piece.colour):
-                            break
-                    else:
-                        break
-                    possible_move_row += row_inc
-                    possible_move_col += col_inc
-
-        def pawn_moves():
-            # steps
-            steps = 1 if piece.moved else 2
-            # vertical
-            start = row + piece.dir
-            end = row + (piece.dir * (1 + steps))
-            for possible_move_row in range(start, end, piece.dir):
-                if Square.in_range(possible_move_row):
-                    if self.squares[possible_move_row][col].isempty():
-                        initial = Square(row, col)
-                        final = Square(possible_move_row, col)
-                        move = Move(initial, final)
-                        # check fo checks
-                        if bl:
-                            if not self.in_check(piece, move):
-                                piece.add_move(move)
-                        else:
-                            piece.add_move(move)
-                    else:
-                        break
-                        # therefore blocked
-                else:
-                    break
-                    # not in range
-            # diagonal/taking
-            possible_move_row = row + piece.dir
-            possible_move_cols = [col - 1, col + 1]
-            for possible_move_col in possible_move_cols:
-                if Square.in_range(possible_move_row, possible_move_col):
-                    if self.squares[possible_move_row][possible_move_col].has_enemy_piece(piece.colour):
-                        initial = Square(row, col)
-                        final_piece = self.squares[possible_move_row][possible_move_col].piece
-                        final = Square(possible_move_row, possible_move_col, final_piece)
-                        move = Move(initial, final)
-                        # check fo checks
-                        if bl:
-                            if not self.in_check(piece, move):
-                                piece.add_move(move)
-                        else:
-                            piece.add_move(move)
-            # en passant
-            r = 3 if piece.colour == 'white' else 4
-            fr = 2 if piece.colour == 'white' else 5
-            # left en passant
-            if Square.in_range(col - 1) and row == r:
-                if self.squares[row][col - 1].has_enemy_piece(piece.colour):
-                    p = self.squares[row][col - 1].piece
-                    if isinstance(p, Pawn):
-                        if p.en_passant:
-                            move = Move(Square(row, col), Square(fr, col - 1, p))
-                            # check fo checks
-                            if bl:
-                                if not self.in_check(piece, move):
-                                    piece.add_move(move)
-                            else:
-                                piece.add_move(move)
-            # right en passant
-            if Square.in_range(col + 1) and row == r:
-                if self.squares[row][col + 1].has_enemy_piece(piece.colour):
-                    p = self.squares[row][col + 1].piece
-                    if isinstance(p, Pawn):
-                        if p.en_passant:
-                            move = Move(Square(row, col), Square(fr, col + 1, p))
-                            # check fo checks
-                            if bl:
-                                if not self.in_check(piece, move):
-                                    piece.add_move(move)
-                            else:
-                                piece.add_move(move)
-
-        def knight_moves():
-            # 8 possible moves, all variations of 2,1
-            possible_moves = [
-                (row - 2, col + 1),
-                (row - 2, col - 1),
-                (row + 2, col + 1),
-                (row + 2, col - 1),
-                (row + 1, col - 2),
-                (row - 1, col - 2),
-                (row + 1, col + 2),
-                (row - 1, col + 2),
-            ]
-            for possible_move in possible_moves:
-                possible_move_row, possible_move_col = possible_move
-                if Square.in_range(possible_move_row, possible_move_col):
-                    if self.squares[possible_move_row][possible_move_col].isempty_or_enemy(piece.colour):
-                        initial = Square(row, col)
-                        final_piece = self.squares[possible_move_row][possible_move_col].piece
-                        final = Square(possible_move_row, possible_move_col, final_piece)  # piece = piece
-                        move = Move(initial, final)
-                        # check fo checks
-                        if bl:
-                            if not self.in_check(piece, move):
-                                piece.add_move(move)
-                            else:
-                                break
-                        else:
-                            piece.add_move(move)
-
-        def king_moves():
-            possible_moves = [
-                (row, col + 1),
-                (row, col - 1),
-                (row + 1, col),
-                (row - 1, col),
-                (row + 1, col - 1),
-                (row - 1, col - 1),
-                (row + 1, col + 1),
-                (row - 1, col + 1),
-            ]
-            for possible_move in possible_moves:
-                possible_move_row, possible_move_col = possible_move
-                if Square.in_range(possible_move_row, possible_move_col):
-                    if self.squares[possible_move_row][possible_move_col].isempty_or_enemy(piece.colour):
-                        initial = Square(row, col)
-                        final = Square(possible_move_row, possible_move_col)  # piece = piece
-                        move = Move(initial, final)
-                        if bl:
-                            if not self.in_check(piece, move):
-                                piece.add_move(move)
-                        else:
-                            piece.add_move(move)
-            # castling
-            if not piece.moved:
-                left_rook, right_rook = self.squares[row][0].piece, self.squares[row][7].piece
-                if isinstance(left_rook, Rook):
-                    if not left_rook.moved:
-                        for c in range(1, 4):
-                            if self.squares[row][c].has_piece():
-                                break
-                            if c == 3:
-                                piece.left_rook = left_rook
-                                moveL = Move(Square(row, 0), Square(row, 3))
-                                moveK = Move(Square(row, col), Square(row, 2))
-                                if bl:
-                                    if not self.in_check(piece, moveK) and not self.in_check(left_rook, moveL):
-                                        left_rook.add_move(moveL)
-                                        piece.add_move(moveK)
-                                    else:
-                                        break
-                                else:
-                                    left_rook.add_move(moveL)
-                                    piece.add_move(moveK)
-
-                if isinstance(right_rook, Rook):
-                    if not right_rook.moved:
-                        for c in range(5, 7):
-                            if self.squares[row][c].has_piece():
-                                break
-                            if c == 6:
-                                piece.right_rook = right_rook
-                                moveR = Move(Square(row, 7), Square(row, 5))
-                                moveK = Move(Square(row, col), Square(row, 6))
-                                if bl:
-                                    if not self.in_check(piece, moveK) and not self.in_check(right_rook, moveR):
-                                        right_rook.add_move(moveR)
-                                        piece.add_move(moveK)
-                                    else:
-                                        break
-                                else:
-                                    right_rook.add_move(moveR)
-                                    piece.add_move(moveK)
-
-        if isinstance(piece, Pawn):
-            pawn_moves()
-
-        elif isinstance(piece, Knight):
-            knight_moves()
-
-        elif isinstance(piece, Bishop):
-            straight_line_moves([
-                (1, 1), (1, -1), (-1, 1), (-1, -1)
-            ])
-
-        elif isinstance(piece, Rook):
-            straight_line_moves([
-                (1, 0), (-1, 0), (0, 1), (0, -1)
-            ])
-
-        elif isinstance(piece, Queen):
-            straight_line_moves([
-                (1, 1), (1, -1), (-1, 1), (-1, -1),
-                (1, 0), (-1, 0), (0, 1), (0, -1)
-            ])
-
-        elif isinstance(piece, King):
-            king_moves()
+        frm = row * 8 + col
+        piece.clear_moves()
+        for key in keys:
+            # the UI promotes to a queen, so the other promotions are left out
+            if key & 63 != frm or move_promotion(key) not in (None, QUEEN):
+                continue
+            to_row, to_col = divmod((key >> 6) & 63, 8)
+            final = Square(to_row, to_col, self.squares[to_row][to_col].piece)
+            piece.add_move(Move(Square(row, col), final))
 
     def _create(self):
         for row in range(ROWS):
@@ -347,9 +185,9 @@ class Board:
         # king
         self.squares[row_pieces][4] = Square(row_pieces, 4, King(colour))
 
-    def check_promotion(self, piece, final):
+    def check_promotion(self, piece, final, promotion='queen'):
         if final.row == 0 or final.row == 7:
-            self.squares[final.row][final.col].piece = Queen(piece.colour)
+            self.squares[final.row][final.col].piece = PIECE_CLASSES[PIECE_NAMES.index(promotion)](piece.colour)
 
     def set_true_en_passant(self, piece):
         if not isinstance(piece, Pawn):
@@ -1,5 +1,7 @@
+import math
 import pygame
 import os
+from const import *
 from sound import Sound
 from theme import Theme
 
@@ -16,11 +18,41 @@ class Config:
             os.path.join('assets', 'sounds', 'move.wav'))
         self.capture_sound = Sound(
             os.path.join('assets', 'sounds', 'capture.wav'))
+        self.background = self._render_background()
 
     def change_theme(self):
         self.index += 1
         self.index %= len(self.themes)
         self.theme = self.themes[self.index]
+        self.background = self._render_background()
+
+    def _render_background(self):
+        """Draws the squares and coordinate labels of the current theme once."""
+        theme = self.theme
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        f = 1
+        for row in range(ROWS):
+            f = math.fabs(f - 1)
+            for col in range(COLS):
+                if f == 1:
+                    colour, f = theme.bg.dark, 0  # dark
+                else:
+                    colour, f = theme.bg.light, 1  # light
+                rect = (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                pygame.draw.rect(surface, colour, rect)
+                if col == 0:
+                    colour = theme.bg.dark if row % 2 == 0 else theme.bg.light
+                    lbl = self.font.render(str(ROWS - row), 1, colour)
+                    lbl_pos = (5, 5 + row * SQUARE_SIZE)
+                    surface.blit(lbl, lbl_pos)
+                if row == 7:
+                    colour = theme.bg.dark if (row + col) % 2 == 0 else theme.bg.light
+                    lbl = self.font.render(chr(col+65), 1, colour)
+                    lbl_pos = (col * SQUARE_SIZE + SQUARE_SIZE - 20, HEIGHT - 20)
+                    surface.blit(lbl, lbl_pos)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        return surface
 
     def _add_themes(self):
         blue = Theme((167, 216, 232), (36, 166, 209),
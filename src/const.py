@@ -2,4 +2,5 @@ WIDTH = 640
 HEIGHT = 640
 ROWS = 8
 COLS = 8
-SQUARE_SIZE = int(WIDTH / COLS)
\ No newline at end of file
+SQUARE_SIZE = int(WIDTH / COLS)
+FPS = 60
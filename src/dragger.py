@@ -1,6 +1,5 @@
-import pygame
-
 from const import *
+from texture import textures
 
 
 class Dragger:
@@ -13,13 +12,14 @@ class Dragger:
         self.initial_col = 0
 
     def update_blit(self, surface):
-        self.piece.set_texture(size=120)
-        texture = self.piece.texture
-        img = pygame.image.load(texture)
+        img = textures.get(self.piece, 120)
         img_center = (self.mouseX, self.mouseY)
         self.piece.texture_rect = img.get_rect(center=img_center)
         surface.blit(img, self.piece.texture_rect)
 
+    def rect(self):
+        return textures.get(self.piece, 120).get_rect(center=(self.mouseX, self.mouseY))
+
     def update_mouse(self, pos: tuple):
         self.mouseX, self.mouseY = pos
 
@@ -1,11 +1,10 @@
-import math
-
 import pygame
 
 from const import *
 from board import Board
 from dragger import Dragger
 from config import Config
+from texture import textures
 
 
 class Game:
@@ -15,29 +14,12 @@ class Game:
         self.dragger = Dragger()
         self.next_player = 'white'
         self.config = Config()
+        # screen areas that must be redrawn on the next frame
+        self.dirty_rects = []
+        self.mark_all()
 
     def show_bg(self, surface):
-        theme = self.config.theme
-        f = 1
-        for row in range(ROWS):
-            f = math.fabs(f - 1)
-            for col in range(COLS):
-                if f == 1:
-                    colour, f = theme.bg.dark, 0  # dark
-                else:
-                    colour, f = theme.bg.light, 1  # light
-                rect = (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-                pygame.draw.rect(surface, colour, rect)
-                if col == 0:
-                    colour = theme.bg.dark if row % 2 == 0 else theme.bg.light
-                    lbl = self.config.font.render(str(ROWS - row), 1, colour)
-                    lbl_pos = (5, 5 + row * SQUARE_SIZE)
-                    surface.blit(lbl, lbl_pos)
-                if row == 7:
-                    colour = theme.bg.dark if (row + col) % 2 == 0 else theme.bg.light
-                    lbl = self.config.font.render(chr(col+65), 1, colour)
-                    lbl_pos = (col * SQUARE_SIZE + SQUARE_SIZE - 20, HEIGHT - 20)
-                    surface.blit(lbl, lbl_pos)
+        surface.blit(self.config.background, (0, 0))
 
     def show_pieces(self, surface):
         for row in range(ROWS):
@@ -47,8 +29,7 @@ class Game:
 
                     # no dragger piece
                     if piece is not self.dragger.piece:
-                        piece.set_texture(80)
-                        img = pygame.image.load(piece.texture)
+                        img = textures.get(piece, 80)
                         img_center = col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2
                         piece.texture_rect = img.get_rect(center=img_center)
                         surface.blit(img, piece.texture_rect)
@@ -78,14 +59,87 @@ class Game:
             rect = (self.hovered_sqr.col * SQUARE_SIZE, self.hovered_sqr.row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
             pygame.draw.rect(surface, colour, rect, width=3)
 
+    def show_thinking(self, surface):
+        lbl = self.config.font.render('Thinking...', 1, (255, 255, 255), (40, 40, 40))
+        surface.blit(lbl, self.thinking_rect())
+
+    def thinking_rect(self):
+        width, height = self.config.font.size('Thinking...')
+        return pygame.Rect(WIDTH - width - 5, 5, width, height)
+
+    def render(self, surface, thinking=False):
+        """
+        Redraws the dirty areas only, clipped to each of them.
+        :return: the rects that were redrawn, for pygame.display.update
+        """
+        rects = []
+        for rect in self.dirty_rects:
+            for i, other in enumerate(rects):
+                if rect.colliderect(other):
+                    rects[i] = other.union(rect)
+                    break
+            else:
+                rects.append(rect)
+        self.dirty_rects = []
+
+        for rect in rects:
+            surface.set_clip(rect)
+            self.show_bg(surface)
+            self.show_last_move(surface)
+            self.show_moves(surface)
+            self.show_pieces(surface)
+            self.show_hover(surface)
+            if self.dragger.dragging:
+                self.dragger.update_blit(surface)
+            if thinking:
+                self.show_thinking(surface)
+        surface.set_clip(None)
+        return rects
+
+    def mark_all(self):
+        self.dirty_rects = [pygame.Rect(0, 0, WIDTH, HEIGHT)]
+
+    def mark_square(self, row, col):
+        self.dirty_rects.append(pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+    def mark_moves(self, piece):
+        for move in piece.moves:
+            self.mark_square(move.final.row, move.final.col)
+
+    def mark_drag(self):
+        if self.dragger.dragging:
+            self.dirty_rects.append(self.dragger.rect())
+
+    def mark_thinking(self):
+        self.dirty_rects.append(self.thinking_rect())
+
+    def snapshot(self):
+        return [square.piece for row in self.board.squares for square in row], self.board.last_move
+
+    def mark_move(self, before):
+        """Marks every square whose piece or last-move highlight changed since snapshot()."""
+        pieces, last_move = before
+        for row in range(ROWS):
+            for col in range(COLS):
+                if self.board.squares[row][col].piece is not pieces[row * COLS + col]:
+                    self.mark_square(row, col)
+        for move in (last_move, self.board.last_move):
+            if move:
+                self.mark_square(move.initial.row, move.initial.col)
+                self.mark_square(move.final.row, move.final.col)
+
     def next_turn(self):
         self.next_player = 'white' if self.next_player == 'black' else 'black'
 
     def set_hover(self, row, col):
+        if self.hovered_sqr:
+            self.mark_square(self.hovered_sqr.row, self.hovered_sqr.col)
         self.hovered_sqr = self.board.squares[row][col]
+        self.mark_square(row, col)
 
     def change_theme(self):
         self.config.change_theme()
+        self.mark_all()
 
     def reset(self):
         self.__init__()
@@ -1,10 +1,12 @@
 import pygame
+import queue
 import sys
+import threading
 from const import *
 from game import Game
 from square import Square
 from move import Move
-from minimax import get_best_move_optimized
+from minimax import EngineState, get_best_move_optimized, stop_search
 import time
 
 AI_MOVE_EVENT = pygame.USEREVENT + 1
@@ -15,37 +17,80 @@ class Main:
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         self.depth = 4
+        # redraw only the squares that changed; False repaints the whole board every frame
+        self.dirty_rendering = True
+        self.clock = pygame.time.Clock()
         # self.depth = int(input("Analysis Depth: "))
         pygame.display.set_caption('Chess Engine')
         self.game = Game()
+        # the AI searches on a background thread and hands its move back
+        # through this queue, tagged with the id of the search it came from
+        self.ai_results = queue.Queue()
+        self.ai_thinking = False
+        self.search_id = 0
+        # the AI's own engine, so the board's move generation never touches a running search
+        self.engine = EngineState()
+
+    def start_ai_move(self):
+        if self.ai_thinking:
+            return
+        self.ai_thinking = True
+        self.game.mark_thinking()
+        self.search_id += 1
+        thread = threading.Thread(
+            target=self.search_ai_move,
+            args=(self.game.board, self.engine, self.search_id),
+            daemon=True
+        )
+        thread.start()
 
-    def play_ai_move(self):
-        game = self.game
-        board = game.board
-
+    def search_ai_move(self, board, engine, search_id):
+        # engine is passed in, not read from self: cancel_ai_move swaps self.engine
+        # for a fresh one while this thread may still be starting up
         best_move = get_best_move_optimized(
             board,
             depth=self.depth,
             maximizing_player=True,
             time_limit=3.0,
-            verbose=True
+            verbose=True,
+            engine=engine
         )
+        self.ai_results.put((search_id, best_move))
+
+    def cancel_ai_move(self):
+        if self.ai_thinking:
+            stop_search(self.engine)
+            # the cancelled search may still be unwinding on its thread
+            self.engine = EngineState()
+            self.game.mark_thinking()
+        # results of the cancelled search are ignored when they arrive
+        self.search_id += 1
+        self.ai_thinking = False
+
+    def poll_ai_move(self):
+        try:
+            search_id, best_move = self.ai_results.get_nowait()
+        except queue.Empty:
+            return
+        if search_id != self.search_id:
+            return
+        self.ai_thinking = False
+        self.game.mark_thinking()
+        self.play_ai_move(best_move)
+
+    def play_ai_move(self, best_move):
+        game = self.game
+        board = game.board
 
         if not best_move:
             return
 
         piece, (_, _), move = best_move
-        captured = board.squares[move.final.row][move.final.col].has_piece()
-
-        board.move(piece, move)
+        before = game.snapshot()
+        captured = board.move(piece, move)
         game.sound_effect(captured)
         board.set_true_en_passant(piece)
-
-        game.show_bg(self.screen)
-        game.show_last_move(self.screen)
-        game.show_moves(self.screen)
-        game.show_pieces(self.screen)
-        game.show_hover(self.screen)
+        game.mark_move(before)
 
         game.next_turn()
 
@@ -56,27 +101,20 @@ class Main:
         dragger = self.game.dragger
         board = self.game.board
         while True:
-            game.show_bg(screen)
-            game.show_last_move(screen)
-            game.show_pieces(screen)
-            game.show_moves(screen)
-            game.show_hover(screen)
-
-            if dragger.dragging:
-                game.show_bg(screen)
-                game.show_last_move(screen)
-                game.show_moves(screen)
-                game.show_pieces(screen)
-                game.show_hover(screen)
-                dragger.update_blit(screen)
-
-            for event in pygame.event.get():
+            self.poll_ai_move()
+
+            events = pygame.event.get()
+            if not events and not self.ai_thinking and not game.dirty_rects:
+                # nothing to redraw and nothing to wait for: sleep until the next event
+                events = [pygame.event.wait()]
+
+            for event in events:
 
                 if event.type == AI_MOVE_EVENT:
-                    self.play_ai_move()
+                    self.start_ai_move()
 
-                # i) click
-                if event.type == pygame.MOUSEBUTTONDOWN:
+                # i) click (ignored while the AI is thinking)
+                if event.type == pygame.MOUSEBUTTONDOWN and not self.ai_thinking:
                     dragger.update_mouse(event.pos)
                     # print(event.pos)
                     clicked_row = dragger.mouseY // SQUARE_SIZE
@@ -90,20 +128,24 @@ class Main:
                             board.calc_moves(piece, clicked_row, clicked_col, bl=True)
                             dragger.save_initial(event.pos)
                             dragger.drag_piece(piece)
-                            # show methods
-                            game.show_bg(screen)
-                            game.show_last_move(screen)
-                            game.show_moves(screen)
-                            game.show_pieces(screen)
+                            # the piece is no longer drawn on its square while dragged
+                            game.mark_square(clicked_row, clicked_col)
+                            game.mark_moves(piece)
+                            game.mark_drag()
 
                 # ii) mouse track
                 if event.type == pygame.MOUSEMOTION:
                     if dragger.dragging:
+                        game.mark_drag()
                         dragger.update_mouse(event.pos)
+                        game.mark_drag()
 
                 # iii) release
                 if event.type == pygame.MOUSEBUTTONUP:
                     if dragger.dragging:
+                        game.mark_drag()
+                        game.mark_moves(dragger.piece)
+                        game.mark_square(dragger.initial_row, dragger.initial_col)
                         dragger.update_mouse(event.pos)
                         released_row = dragger.mouseY // SQUARE_SIZE
                         released_col = dragger.mouseX // SQUARE_SIZE
@@ -112,22 +154,19 @@ class Main:
                         final = Square(released_row, released_col)
                         move = Move(initial, final)
                         if board.valid_move(dragger.piece, move):
-                            captured = board.squares[released_row][released_col].has_piece()
-                            board.move(dragger.piece, move)
+                            before = game.snapshot()
+                            captured = board.move(dragger.piece, move)
                             game.sound_effect(captured)
                             board.set_true_en_passant(dragger.piece)
+                            game.mark_move(before)
                             game.next_turn()
                     dragger.undrag_piece()
-                    game.show_bg(screen)
-                    game.show_last_move(screen)
-                    game.show_moves(screen)
-                    game.show_pieces(screen)
-                    game.show_hover(screen)
                     if game.next_player == 'black':
                         pygame.event.post(pygame.event.Event(AI_MOVE_EVENT))
 
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_r:
+                        self.cancel_ai_move()
                         game.reset()
                         game = self.game
                         screen = self.screen
@@ -143,10 +182,15 @@ class Main:
 
                 # quit
                 elif event.type == pygame.QUIT:
+                    self.cancel_ai_move()
                     sys.exit()
 
-            pygame.display.update()
-
+            if not self.dirty_rendering:
+                game.mark_all()
+            rects = game.render(screen, self.ai_thinking)
+            if rects:
+                pygame.display.update(rects)
+            self.clock.tick(FPS)
 
 main = Main()
 main.mainloop()
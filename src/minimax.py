@@ -1,17 +1,24 @@
 import math
+import os
 import random
 import time
 
-from const import ROWS, COLS
+from const import COLS
 from move import Move
 from square import Square
-from piece import Pawn, Knight, Bishop, Rook, Queen, King
+from piece import Pawn, Rook, King
+from bitboard import (
+    Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY,
+    PIECE_NAMES, FULL, NOT_A, NOT_H, NOT_AB, NOT_GH, square, square_name, parse_fen,
+)
+from transposition import (
+    TranspositionTable, PersistentTranspositionTable, EXACT, LOWERBOUND, UPPERBOUND, DEFAULT_SIZE_MB,
+)
 
 # ---------------------------------------------------------------------------
 # Fast constants and tables
 # ---------------------------------------------------------------------------
 INF = 10**9
-EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
 DRAW_SCORE = 0
 
 PIECE_VALUES = {
@@ -90,58 +97,145 @@ PST = {
 # ---------------------------------------------------------------------------
 # Zobrist hashing
 # ---------------------------------------------------------------------------
-random.seed(20241229)
-PIECE_INDEX = {
-    ('white', 'pawn'): 0,
-    ('white', 'knight'): 1,
-    ('white', 'bishop'): 2,
-    ('white', 'rook'): 3,
-    ('white', 'queen'): 4,
-    ('white', 'king'): 5,
-    ('black', 'pawn'): 6,
-    ('black', 'knight'): 7,
-    ('black', 'bishop'): 8,
-    ('black', 'rook'): 9,
-    ('black', 'queen'): 10,
-    ('black', 'king'): 11,
-}
-ZOBRIST_PIECES = [[random.getrandbits(64) for _ in range(64)] for _ in range(12)]
-ZOBRIST_SIDE = random.getrandbits(64)
-ZOBRIST_CASTLING = [random.getrandbits(64) for _ in range(16)]
-ZOBRIST_EP = [random.getrandbits(64) for _ in range(8)]
+# The keys come from a fixed seed so hashes are the same in every process and
+# run, which table files rely on. Changing the seed or the order the keys are
+# drawn in changes ZOBRIST_SIGNATURE and so invalidates existing files.
+ZOBRIST_SEED = 20241229
+_zobrist_random = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIGNATURE = ZOBRIST_SIDE ^ ZOBRIST_EP[7]
 Q_DEPTH_LIMIT = 8
+MAX_PLY = 128
+LEGAL_CACHE_SIZE = 1 << 15
+# Late move reductions: quiet moves after the first LMR_FULL_MOVES of a node at
+# depth >= LMR_MIN_DEPTH are searched one ply shallower, two from LMR_LATE_MOVES
+# on if they have no history, and searched again in full if they beat alpha.
+LMR_MIN_DEPTH = 3
+LMR_FULL_MOVES = 3
+LMR_LATE_MOVES = 6
+# Pruning margins in centipawns. Quiescence skips a capture that would leave
+# the side to move below alpha even after winning the piece plus DELTA_MARGIN.
+# At depth 1-2, quiet moves are not searched (futility) when the static
+# evaluation plus FUTILITY_MARGINS[depth] cannot reach alpha, and a node drops
+# straight into quiescence (razoring) when it is RAZOR_MARGINS[depth] short.
+DELTA_MARGIN = 200
+FUTILITY_MARGINS = (0, PIECE_VALUES['bishop'], PIECE_VALUES['rook'])
+RAZOR_MARGINS = (0, PIECE_VALUES['rook'], PIECE_VALUES['queen'])
+# Cross-check the incremental evaluation against a full board scan at every
+# call. Very slow; only meant for debugging make_move/undo_move.
+DEBUG_EVAL = False
+
+# Material and piece-square score of every piece code (on every square), signed
+# from white's point of view.
+KIND_VALUES = [PIECE_VALUES[name] for name in PIECE_NAMES]
+MATERIAL_SCORES = [(1 if code < 6 else -1) * KIND_VALUES[code % 6] for code in range(12)]
+PST_SCORES = [
+    [(1 if code < 6 else -1) * PST[PIECE_NAMES[code % 6]][sq // 8 if code < 6 else 7 - sq // 8][sq % 8]
+     for sq in range(64)]
+    for code in range(12)
+]
+PIECE_SQUARE_SCORES = [[MATERIAL_SCORES[code] + PST_SCORES[code][sq] for sq in range(64)] for code in range(12)]
+
+# Castling rights that survive a move touching each square.
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[square(7, 4)] = 15 & ~(1 | 2)
+CASTLING_MASKS[square(7, 7)] = 15 & ~1
+CASTLING_MASKS[square(7, 0)] = 15 & ~2
+CASTLING_MASKS[square(0, 4)] = 15 & ~(4 | 8)
+CASTLING_MASKS[square(0, 7)] = 15 & ~4
+CASTLING_MASKS[square(0, 0)] = 15 & ~8
 
 # ---------------------------------------------------------------------------
 # Engine state container
 # ---------------------------------------------------------------------------
 class EngineState:
-    def __init__(self):
-        self.tt = {}
-        self.killers = [[None, None] for _ in range(128)]
-        self.history = {}
+    """
+    Everything one search reads and writes: TT, killers, history, counters,
+    the position's castling/en passant/hash and evaluation terms, and the
+    repetition and undo stacks.
+
+    Every function below that touches this state takes it as its last
+    argument, ``engine``, which defaults to the module-level instance. Give
+    each concurrent game or search its own EngineState (sized independently)
+    and pass it along; searches on different instances never share anything.
+    """
+
+    def __init__(self, tt_size_mb=DEFAULT_SIZE_MB):
+        self.tt = TranspositionTable(tt_size_mb)
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * 4096  # indexed by the from/to bits of a move
         self.nodes = 0
         self.tt_hits = 0
         self.cutoffs = 0
         self.start_time = 0.0
         self.time_limit = None
+        self.stopped = False
         self.current_hash = 0
         self.castling_rights = 0
-        self.ep_file = None
-        self.king_pos = {'white': (0, 4), 'black': (7, 4)}
+        self.ep_square = None
+        # Running evaluation terms, kept up to date by make_move/undo_move.
+        self.material = 0
+        self.pst = 0
+        self.non_pawn_material = 0
+        self.pawn_material = 0
+        self.queens = 0
         self.rep_stack = []
         self.rep_counts = {}
-
-    def reset(self, start_hash, time_limit=None):
+        # Restricts the moves searched at the root (parallel root splitting).
+        self.root_moves = None
+        self.worker_nodes = []
+        # make_move saves what undo_move needs into these records instead of
+        # allocating one per move: captured piece, its square, previous en
+        # passant square, castling rights, hash, material and PST score.
+        self.undo_stack = [[EMPTY, 0, None, 0, 0, 0, 0] for _ in range(MAX_PLY)]
+        self.undo_top = 0
+        # Legal move lists by position hash; kept across searches.
+        self.legal_cache = {}
+        # Triangular PV table: row ply holds the best line found from that ply.
+        self.pv_table = [[0] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+        # PV of the last completed iteration, searched first by the next one
+        # while follow_pv says the search is still on it.
+        self.pv = []
+        self.follow_pv = False
+        # Search features, switchable for comparing their node counts.
+        self.use_pvs = True
+        self.use_lmr = True
+        self.pvs_searches = 0
+        self.pvs_researches = 0
+        self.lmr_reductions = 0
+        self.lmr_researches = 0
+        self.delta_prunes = 0
+        self.futility_prunes = 0
+        self.razor_cutoffs = 0
+
+    def reset(self, time_limit=None):
         self.nodes = 0
         self.tt_hits = 0
         self.cutoffs = 0
         self.start_time = time.time()
         self.time_limit = time_limit
-        self.current_hash = start_hash
+        self.stopped = False
+        self.current_hash = 0
         self.castling_rights = 0
-        self.ep_file = None
+        self.ep_square = None
         self.rep_stack = []
         self.rep_counts = {}
+        self.root_moves = None
+        self.worker_nodes = []
+        self.undo_top = 0
+        self.pv = []
+        self.follow_pv = False
+        self.pvs_searches = 0
+        self.pvs_researches = 0
+        self.lmr_reductions = 0
+        self.lmr_researches = 0
+        self.delta_prunes = 0
+        self.futility_prunes = 0
+        self.razor_cutoffs = 0
 
 engine = EngineState()
 
@@ -160,44 +254,74 @@ def pst_value(piece, row, col):
     return table[row][col] if piece.colour == 'white' else table[mirror_index(row)][col]
 
 
-def evaluate(board):
+def evaluate(pos, engine=engine):
+    score = engine.material + engine.pst
+    if DEBUG_EVAL:
+        assert score == evaluate_full(pos), (score, evaluate_full(pos))
+    return score
+
+
+def evaluate_full(pos):
     score = 0
-    for row in range(ROWS):
-        row_squares = board.squares[row]
-        for col in range(COLS):
-            p = row_squares[col].piece
-            if p:
-                base = PIECE_VALUES[p.name]
-                sign = 1 if p.colour == 'white' else -1
-                score += sign * base
-                score += sign * pst_value(p, row, col)
+    pieces = pos.pieces
+    for code in range(12):
+        bb = pieces[code]
+        table = PIECE_SQUARE_SCORES[code]
+        while bb:
+            lsb = bb & -bb
+            score += table[lsb.bit_length() - 1]
+            bb ^= lsb
     return score
 
 
-def material_is_low(board):
-    total = 0
-    queens = 0
+def material_counts(pos):
+    """Non-pawn material, pawn material and queen count of both sides together."""
+    pieces = pos.pieces
     non_pawn_material = 0
-    for row in range(ROWS):
-        for col in range(COLS):
-            p = board.squares[row][col].piece
-            if not p or isinstance(p, King):
-                continue
-            val = PIECE_VALUES[p.name]
-            total += val
-            if isinstance(p, Queen):
-                queens += 1
-            if not isinstance(p, Pawn):
-                non_pawn_material += val
-    if non_pawn_material == 0:
+    for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+        non_pawn_material += KIND_VALUES[kind] * (pieces[kind] | pieces[6 + kind]).bit_count()
+    pawn_material = KIND_VALUES[PAWN] * (pieces[PAWN] | pieces[6 + PAWN]).bit_count()
+    queens = (pieces[QUEEN] | pieces[6 + QUEEN]).bit_count()
+    return non_pawn_material, pawn_material, queens
+
+
+def material_is_low(pos, engine=engine):
+    if DEBUG_EVAL:
+        counts = (engine.non_pawn_material, engine.pawn_material, engine.queens)
+        assert counts == material_counts(pos), (counts, material_counts(pos))
+    if engine.non_pawn_material == 0:
         return True
-    if queens == 0:
+    if engine.queens == 0:
         return True
-    if total <= 1400:
+    if engine.non_pawn_material + engine.pawn_material <= 1400:
         return True
     return False
 
 
+def init_eval_state(pos, engine=engine):
+    """Recomputes the running evaluation terms from scratch."""
+    material = 0
+    pst = 0
+    for sq, code in enumerate(pos.mailbox):
+        if code != EMPTY:
+            material += MATERIAL_SCORES[code]
+            pst += PST_SCORES[code][sq]
+    engine.material = material
+    engine.pst = pst
+    engine.non_pawn_material, engine.pawn_material, engine.queens = material_counts(pos)
+
+
+def count_material(code, sign, engine=engine):
+    """Adds (sign=1) or removes (sign=-1) one piece from the material counts."""
+    kind = code % 6
+    if kind == PAWN:
+        engine.pawn_material += sign * KIND_VALUES[PAWN]
+    elif kind != KING:
+        engine.non_pawn_material += sign * KIND_VALUES[kind]
+        if kind == QUEEN:
+            engine.queens += sign
+
+
 def detect_castling_rights(board):
     rights = 0
     wk = board.squares[7][4].piece
@@ -206,480 +330,779 @@ def detect_castling_rights(board):
     bk = board.squares[0][4].piece
     bkr = board.squares[0][7].piece
     bqr = board.squares[0][0].piece
-    if isinstance(wk, King) and not wk.moved:
-        if isinstance(wkr, Rook) and not wkr.moved:
+    if isinstance(wk, King) and wk.colour == 'white' and not wk.moved:
+        if isinstance(wkr, Rook) and wkr.colour == 'white' and not wkr.moved:
             rights |= 1
-        if isinstance(wqr, Rook) and not wqr.moved:
+        if isinstance(wqr, Rook) and wqr.colour == 'white' and not wqr.moved:
             rights |= 2
-    if isinstance(bk, King) and not bk.moved:
-        if isinstance(bkr, Rook) and not bkr.moved:
+    if isinstance(bk, King) and bk.colour == 'black' and not bk.moved:
+        if isinstance(bkr, Rook) and bkr.colour == 'black' and not bkr.moved:
             rights |= 4
-        if isinstance(bqr, Rook) and not bqr.moved:
+        if isinstance(bqr, Rook) and bqr.colour == 'black' and not bqr.moved:
             rights |= 8
     return rights
 
 
-def initial_hash(board):
+def detect_en_passant(board, colour):
+    """Square behind a pawn the side to move may take en passant, or None."""
+    enemy = 'black' if colour == WHITE else 'white'
+    row = 3 if enemy == 'black' else 4
+    last = board.last_move
+    for col in range(COLS):
+        p = board.squares[row][col].piece
+        if isinstance(p, Pawn) and p.colour == enemy and p.en_passant:
+            if last is None or (last.final.row == row and last.final.col == col
+                                and abs(last.initial.row - row) == 2):
+                return square(row - 1 if enemy == 'black' else row + 1, col)
+    return None
+
+
+def initial_hash(pos, colour, engine=engine):
     h = 0
-    for row in range(ROWS):
-        row_squares = board.squares[row]
-        for col in range(COLS):
-            sqp = row_squares[col].piece
-            if sqp:
-                idx = PIECE_INDEX[(sqp.colour, sqp.name)]
-                h ^= ZOBRIST_PIECES[idx][row * 8 + col]
-                if isinstance(sqp, King):
-                    engine.king_pos[sqp.colour] = (row, col)
-
-    rights = detect_castling_rights(board)
-    engine.castling_rights = rights
-    h ^= ZOBRIST_CASTLING[rights]
-    engine.ep_file = None
+    for sq, code in enumerate(pos.mailbox):
+        if code != EMPTY:
+            h ^= ZOBRIST_PIECES[code][sq]
+    h ^= ZOBRIST_CASTLING[engine.castling_rights]
+    if engine.ep_square is not None:
+        h ^= ZOBRIST_EP[engine.ep_square & 7]
+    if colour == BLACK:
+        h ^= ZOBRIST_SIDE
     return h
 
+
+def setup_position(pos, colour, castling_rights=0, ep_square=None, engine=engine):
+    """Primes the engine state (rights, hash, evaluation terms) for pos."""
+    engine.castling_rights = castling_rights
+    engine.ep_square = ep_square
+    engine.current_hash = initial_hash(pos, colour, engine)
+    init_eval_state(pos, engine)
+
+
+def load_fen(fen, engine=engine):
+    """Parses a FEN string and primes the engine state for it; returns ``(pos, colour)``."""
+    pos, colour, castling_rights, ep_square, _, _ = parse_fen(fen)
+    setup_position(pos, colour, castling_rights, ep_square, engine=engine)
+    return pos, colour
+
+
+def load_board(board, colour, engine=engine):
+    """Converts a UI Board to a Position and primes the engine state for it."""
+    pos = Position.from_board(board)
+    setup_position(pos, colour, detect_castling_rights(board), detect_en_passant(board, colour), engine=engine)
+    return pos
+
 # ---------------------------------------------------------------------------
 # Move encoding for heuristics/TT
 # ---------------------------------------------------------------------------
+# Moves are 16-bit integers: from square in bits 0-5, to square in bits 6-11
+# and flags in bits 12-15. The same integer is used for ordering, killers,
+# history and the TT; Move objects are only built for the UI.
+QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE = 0, 1, 2, 3, 4, 5
+PROMOTION = 8  # flags 8-11 promote to knight, bishop, rook, queen; | CAPTURE for captures
+CAPTURE_BIT = CAPTURE << 12
+PROMOTION_BIT = PROMOTION << 12
+PROMOTION_FLAGS = tuple((PROMOTION | (kind - KNIGHT)) << 12 for kind in (QUEEN, ROOK, BISHOP, KNIGHT))
+
 
-def encode_move(move, promotion=None):
-    return (move.initial.row, move.initial.col, move.final.row, move.final.col, promotion)
+def encode_move(frm, to, flags=QUIET):
+    return frm | to << 6 | flags << 12
 
 
-def same_move(a, b):
-    return a and b and encode_move(a) == encode_move(b)
+def move_promotion(move):
+    """Piece kind a move promotes to, or None."""
+    return ((move >> 12) & 3) + KNIGHT if move & PROMOTION_BIT else None
 
 # ---------------------------------------------------------------------------
 # Attack detection
 # ---------------------------------------------------------------------------
-KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-
-
-def square_attacked(board, row, col, attacker_colour):
-    pawn_dir = -1 if attacker_colour == 'white' else 1
-    pawn_rows = row + pawn_dir
-    for dc in (-1, 1):
-        c = col + dc
-        if 0 <= pawn_rows < 8 and 0 <= c < 8:
-            p = board.squares[pawn_rows][c].piece
-            if isinstance(p, Pawn) and p.colour == attacker_colour:
-                return True
-
-    for dr, dc in KNIGHT_OFFSETS:
-        r, c = row + dr, col + dc
-        if 0 <= r < 8 and 0 <= c < 8:
-            p = board.squares[r][c].piece
-            if isinstance(p, Knight) and p.colour == attacker_colour:
-                return True
-
-    # Bishops / Queens (diagonals)
-    for dr, dc in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
-        r, c = row + dr, col + dc
-        while 0 <= r < 8 and 0 <= c < 8:
-            p = board.squares[r][c].piece
-            if p:
-                if p.colour == attacker_colour and (isinstance(p, Bishop) or isinstance(p, Queen)):
-                    return True
-                break
-            r += dr
-            c += dc
-
-    # Rooks / Queens (orthogonal)
-    for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1)):
-        r, c = row + dr, col + dc
-        while 0 <= r < 8 and 0 <= c < 8:
-            p = board.squares[r][c].piece
-            if p:
-                if p.colour == attacker_colour and (isinstance(p, Rook) or isinstance(p, Queen)):
-                    return True
-                break
-            r += dr
-            c += dc
+# (shift, mask) pairs for one step in each direction; the mask drops bits that
+# wrapped around the board edge. Positive shifts move towards h1.
+SOUTH_EAST, SOUTH, SOUTH_WEST, EAST = (9, NOT_A), (8, FULL), (7, NOT_H), (1, NOT_A)
+NORTH_WEST, NORTH, NORTH_EAST, WEST = (-9, NOT_H), (-8, FULL), (-7, NOT_A), (-1, NOT_H)
+
+
+def knight_attacks(bb):
+    return (((bb >> 15) & NOT_A) | ((bb >> 17) & NOT_H)
+            | ((bb << 17) & NOT_A) | ((bb << 15) & NOT_H)
+            | ((bb << 6) & NOT_GH) | ((bb >> 10) & NOT_GH)
+            | ((bb << 10) & NOT_AB) | ((bb >> 6) & NOT_AB))
+
+
+def king_attacks(bb):
+    attacks = ((bb << 1) & NOT_A) | ((bb >> 1) & NOT_H)
+    bb |= attacks
+    return (attacks | (bb << 8) | (bb >> 8)) & FULL
+
+
+def pawn_attacks(bb, colour):
+    if colour == WHITE:
+        return ((bb >> 9) & NOT_H) | ((bb >> 7) & NOT_A)
+    return ((bb << 7) & NOT_H) | ((bb << 9) & NOT_A)
+
+
+def ray(sq, step):
+    """Squares from sq (exclusive) to the board edge in one direction."""
+    shift, mask = step
+    attacks = 0
+    b = 1 << sq
+    while True:
+        b = ((b << shift) if shift > 0 else (b >> -shift)) & mask
+        if not b:
+            return attacks
+        attacks |= b
+
+
+# Attack tables, built once at import and indexed by square.
+KNIGHT_ATTACKS = [knight_attacks(1 << sq) for sq in range(64)]
+KING_ATTACKS = [king_attacks(1 << sq) for sq in range(64)]
+PAWN_ATTACKS = [[pawn_attacks(1 << sq, colour) for sq in range(64)] for colour in (WHITE, BLACK)]
+RAY_SE = [ray(sq, SOUTH_EAST) for sq in range(64)]
+RAY_S = [ray(sq, SOUTH) for sq in range(64)]
+RAY_SW = [ray(sq, SOUTH_WEST) for sq in range(64)]
+RAY_E = [ray(sq, EAST) for sq in range(64)]
+RAY_NW = [ray(sq, NORTH_WEST) for sq in range(64)]
+RAY_N = [ray(sq, NORTH) for sq in range(64)]
+RAY_NE = [ray(sq, NORTH_EAST) for sq in range(64)]
+RAY_W = [ray(sq, WEST) for sq in range(64)]
+BISHOP_RAYS = [RAY_SE[sq] | RAY_SW[sq] | RAY_NW[sq] | RAY_NE[sq] for sq in range(64)]
+ROOK_RAYS = [RAY_S[sq] | RAY_E[sq] | RAY_N[sq] | RAY_W[sq] for sq in range(64)]
+
+
+def bishop_attacks(sq, occupied):
+    # The nearest blocker is the lowest set bit on rays pointing towards h1 and
+    # the highest set bit on rays pointing towards a8; everything behind it is
+    # cut off by xoring that blocker's own ray in the same direction.
+    attacks = 0
+    r = RAY_SE[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_SE[(blockers & -blockers).bit_length() - 1]
+    attacks |= r
+    r = RAY_SW[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_SW[(blockers & -blockers).bit_length() - 1]
+    attacks |= r
+    r = RAY_NW[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_NW[blockers.bit_length() - 1]
+    attacks |= r
+    r = RAY_NE[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_NE[blockers.bit_length() - 1]
+    return attacks | r
+
+
+def rook_attacks(sq, occupied):
+    attacks = 0
+    r = RAY_S[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_S[(blockers & -blockers).bit_length() - 1]
+    attacks |= r
+    r = RAY_E[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_E[(blockers & -blockers).bit_length() - 1]
+    attacks |= r
+    r = RAY_N[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_N[blockers.bit_length() - 1]
+    attacks |= r
+    r = RAY_W[sq]
+    blockers = r & occupied
+    if blockers:
+        r ^= RAY_W[blockers.bit_length() - 1]
+    return attacks | r
+
+
+def queen_attacks(sq, occupied):
+    return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+
+def square_attacked(pos, sq, attacker_colour):
+    pieces = pos.pieces
+    base = attacker_colour * 6
+    if PAWN_ATTACKS[attacker_colour ^ 1][sq] & pieces[base + PAWN]:
+        return True
+    if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT]:
+        return True
+    if KING_ATTACKS[sq] & pieces[base + KING]:
+        return True
 
-    for dr, dc in KING_OFFSETS:
-        r, c = row + dr, col + dc
-        if 0 <= r < 8 and 0 <= c < 8:
-            p = board.squares[r][c].piece
-            if isinstance(p, King) and p.colour == attacker_colour:
-                return True
+    # Bishops / Queens (diagonals), skipped when none share a diagonal with sq
+    diagonal = (pieces[base + BISHOP] | pieces[base + QUEEN]) & BISHOP_RAYS[sq]
+    if diagonal and bishop_attacks(sq, pos.occupied) & diagonal:
+        return True
 
+    # Rooks / Queens (orthogonal)
+    orthogonal = (pieces[base + ROOK] | pieces[base + QUEEN]) & ROOK_RAYS[sq]
+    return bool(orthogonal and rook_attacks(sq, pos.occupied) & orthogonal)
+
+
+def attackers_to(pos, sq, occupied):
+    """Pieces of both colours attacking sq, with sliders seeing through the squares missing from occupied."""
+    pieces = pos.pieces
+    return (PAWN_ATTACKS[BLACK][sq] & pieces[PAWN]
+            | PAWN_ATTACKS[WHITE][sq] & pieces[6 + PAWN]
+            | KNIGHT_ATTACKS[sq] & (pieces[KNIGHT] | pieces[6 + KNIGHT])
+            | KING_ATTACKS[sq] & (pieces[KING] | pieces[6 + KING])
+            | bishop_attacks(sq, occupied) & (pieces[BISHOP] | pieces[QUEEN] | pieces[6 + BISHOP] | pieces[6 + QUEEN])
+            | rook_attacks(sq, occupied) & (pieces[ROOK] | pieces[QUEEN] | pieces[6 + ROOK] | pieces[6 + QUEEN]))
+
+
+def king_in_check(pos, colour):
+    return square_attacked(pos, pos.king_square(colour), colour ^ 1)
+
+
+RAYS = (RAY_SE, RAY_S, RAY_SW, RAY_E, RAY_NW, RAY_N, RAY_NE, RAY_W)
+
+
+def check_info(pos, colour):
+    """
+    What gives_check needs to know about colour's checks on the enemy king:
+    ``(king square, squares from which each piece kind gives check, colour's
+    pieces that uncover a check from a slider when they leave their line)``.
+    """
+    ks = pos.king_square(colour ^ 1)
+    pieces = pos.pieces
+    occupied = pos.occupied
+    own = pos.colours[colour]
+    base = colour * 6
+    diagonal = bishop_attacks(ks, occupied)
+    orthogonal = rook_attacks(ks, occupied)
+    targets = (PAWN_ATTACKS[colour ^ 1][ks], KNIGHT_ATTACKS[ks], diagonal, orthogonal, diagonal | orthogonal, 0)
+
+    discoverers = 0
+    sliders = (pieces[base + BISHOP] | pieces[base + QUEEN]) & BISHOP_RAYS[ks]
+    blockers = diagonal & own if sliders else 0
+    while blockers:
+        b = blockers & -blockers
+        blockers ^= b
+        if bishop_attacks(ks, occupied ^ b) & sliders:
+            discoverers |= b
+    sliders = (pieces[base + ROOK] | pieces[base + QUEEN]) & ROOK_RAYS[ks]
+    blockers = orthogonal & own if sliders else 0
+    while blockers:
+        b = blockers & -blockers
+        blockers ^= b
+        if rook_attacks(ks, occupied ^ b) & sliders:
+            discoverers |= b
+    return ks, targets, discoverers
+
+
+def gives_check(pos, move, colour, info, engine=engine):
+    """Whether colour's move checks the enemy king; info is check_info(pos, colour)."""
+    if move >> 12 not in (QUIET, DOUBLE_PUSH, CAPTURE):
+        # castling, en passant and promotions are rare enough to just play out
+        make_move(pos, move, colour, engine)
+        check = king_in_check(pos, colour ^ 1)
+        undo_move(pos, move, engine)
+        return check
+    ks, targets, discoverers = info
+    frm = move & 63
+    to = (move >> 6) & 63
+    if (targets[pos.mailbox[frm] % 6] >> to) & 1:
+        return True
+    if (discoverers >> frm) & 1:
+        # uncovered unless the piece stays on the line between king and slider
+        for rays in RAYS:
+            if (rays[ks] >> frm) & 1:
+                return not (rays[ks] >> to) & 1
     return False
 
-
-def king_in_check(board, colour):
-    kr, kc = engine.king_pos[colour]
-    return square_attacked(board, kr, kc, 'black' if colour == 'white' else 'white')
-
 # ---------------------------------------------------------------------------
 # Move generation (pseudo legal + legality test via make/unmake)
 # ---------------------------------------------------------------------------
 
-def generate_pseudo_moves(board, colour):
-    moves = []
-    forward = -1 if colour == 'white' else 1
-    start_row = 6 if colour == 'white' else 1
-    promo_row = 0 if colour == 'white' else 7
-
-    for row in range(ROWS):
-        row_squares = board.squares[row]
-        for col in range(COLS):
-            piece = row_squares[col].piece
-            if not piece or piece.colour != colour:
-                continue
-
-            if isinstance(piece, Pawn):
-                one = row + forward
-                if 0 <= one < 8 and board.squares[one][col].piece is None:
-                    mv = Move(Square(row, col), Square(one, col))
-                    if one == promo_row:
-                        moves.append((mv, 'queen'))
-                    else:
-                        moves.append((mv, None))
-                    if row == start_row:
-                        two = row + 2 * forward
-                        if board.squares[two][col].piece is None:
-                            moves.append((Move(Square(row, col), Square(two, col)), None))
-
-                for dc in (-1, 1):
-                    c = col + dc
-                    r = row + forward
-                    if 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target and target.colour != colour:
-                            mv = Move(Square(row, col), Square(r, c))
-                            if r == promo_row:
-                                moves.append((mv, 'queen'))
-                            else:
-                                moves.append((mv, None))
-                        # en passant
-                        side_piece = board.squares[row][c].piece if 0 <= c < 8 else None
-                        if side_piece and isinstance(side_piece, Pawn) and side_piece.colour != colour and side_piece.en_passant:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-
-            elif isinstance(piece, Knight):
-                for dr, dc in KNIGHT_OFFSETS:
-                    r, c = row + dr, col + dc
-                    if 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target is None or target.colour != colour:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-
-            elif isinstance(piece, Bishop):
-                for dr, dc in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
-                    r, c = row + dr, col + dc
-                    while 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target is None or target.colour != colour:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-                        if target:
-                            break
-                        r += dr
-                        c += dc
-
-            elif isinstance(piece, Rook):
-                for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1)):
-                    r, c = row + dr, col + dc
-                    while 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target is None or target.colour != colour:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-                        if target:
-                            break
-                        r += dr
-                        c += dc
-
-            elif isinstance(piece, Queen):
-                for dr, dc in ((1, 1), (1, -1), (-1, 1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1)):
-                    r, c = row + dr, col + dc
-                    while 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target is None or target.colour != colour:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-                        if target:
-                            break
-                        r += dr
-                        c += dc
-
-            elif isinstance(piece, King):
-                for dr, dc in KING_OFFSETS:
-                    r, c = row + dr, col + dc
-                    if 0 <= r < 8 and 0 <= c < 8:
-                        target = board.squares[r][c].piece
-                        if target is None or target.colour != colour:
-                            moves.append((Move(Square(row, col), Square(r, c)), None))
-                # castling
-                if not piece.moved and not king_in_check(board, colour):
-                    # king side
-                    if board.squares[row][col + 1].piece is None and board.squares[row][col + 2].piece is None:
-                        rook = board.squares[row][7].piece
-                        if isinstance(rook, Rook) and not rook.moved:
-                            if not square_attacked(board, row, col + 1, 'black' if colour == 'white' else 'white') and not square_attacked(board, row, col + 2, 'black' if colour == 'white' else 'white'):
-                                moves.append((Move(Square(row, col), Square(row, col + 2)), None))
-                    # queen side
-                    if board.squares[row][col - 1].piece is None and board.squares[row][col - 2].piece is None and board.squares[row][col - 3].piece is None:
-                        rook = board.squares[row][0].piece
-                        if isinstance(rook, Rook) and not rook.moved:
-                            if not square_attacked(board, row, col - 1, 'black' if colour == 'white' else 'white') and not square_attacked(board, row, col - 2, 'black' if colour == 'white' else 'white'):
-                                moves.append((Move(Square(row, col), Square(row, col - 2)), None))
-    return moves
-
+def generate_pseudo_moves(pos, colour, engine=engine):
+    return _generate_moves(pos, colour, True, True, engine)
 
-def generate_legal_moves(board, colour):
-    legal = []
-    for move, promo in generate_pseudo_moves(board, colour):
-        undo, new_hash = make_move(board, move, promo, colour)
-        engine.current_hash = new_hash
-        if not king_in_check(board, colour):
-            legal.append((move, promo))
-        undo_move(board, move, undo)
-        engine.current_hash = undo['prev_hash']
-    return legal
 
-# ---------------------------------------------------------------------------
-# Make / unmake with incremental hash
-# ---------------------------------------------------------------------------
+def generate_noisy_moves(pos, colour, engine=engine):
+    """Captures, en passant and promotions: the first stage of pick_moves."""
+    return _generate_moves(pos, colour, True, False, engine)
 
-def clear_en_passant(board):
-    for r in range(ROWS):
-        for c in range(COLS):
-            p = board.squares[r][c].piece
-            if isinstance(p, Pawn):
-                p.en_passant = False
 
+def generate_quiet_moves(pos, colour, engine=engine):
+    """Every pseudo-legal move generate_noisy_moves leaves out, castling included."""
+    return _generate_moves(pos, colour, False, True, engine)
 
-def make_move(board, move, promotion, colour):
-    initial = move.initial
-    final = move.final
-    piece = board.squares[initial.row][initial.col].piece
 
-    prev_hash = engine.current_hash
-    prev_last = getattr(board, 'last_move', None)
-    prev_castling = engine.castling_rights
-    prev_ep = engine.ep_file
-
-    captured_piece = None
-    captured_pos = (final.row, final.col)
-    is_en_passant = False
-    is_castle = False
-    promotion_piece = None
-    piece_moved_prev = piece.moved
-    rook_state = None
-
-    piece_idx = PIECE_INDEX[(piece.colour, piece.name)]
-    engine.current_hash ^= ZOBRIST_PIECES[piece_idx][initial.row * 8 + initial.col]
-
-    target = board.squares[final.row][final.col].piece
-    if isinstance(piece, Pawn) and target is None and final.col != initial.col:
-        is_en_passant = True
-        ep_row = initial.row
-        captured_piece = board.squares[ep_row][final.col].piece
-        captured_pos = (ep_row, final.col)
-        board.squares[ep_row][final.col].piece = None
-    elif target:
-        captured_piece = target
-
-    if captured_piece:
-        cap_idx = PIECE_INDEX[(captured_piece.colour, captured_piece.name)]
-        engine.current_hash ^= ZOBRIST_PIECES[cap_idx][captured_pos[0] * 8 + captured_pos[1]]
-        if isinstance(captured_piece, Rook):
-            if captured_piece.colour == 'white':
-                if captured_pos == (7, 0):
-                    engine.castling_rights &= ~2
-                elif captured_pos == (7, 7):
-                    engine.castling_rights &= ~1
+def _generate_moves(pos, colour, noisy, quiet, engine):
+    moves = []
+    pieces = pos.pieces
+    occupied = pos.occupied
+    empty = FULL ^ occupied if quiet else 0
+    enemy = pos.colours[colour ^ 1] if noisy else 0
+    base = colour * 6
+    forward = -8 if colour == WHITE else 8
+    start_row = 6 if colour == WHITE else 1
+    promo_row = 0 if colour == WHITE else 7
+    ep = engine.ep_square
+    pawn_attacks_from = PAWN_ATTACKS[colour]
+
+    bb = pieces[base + PAWN]
+    while bb:
+        lsb = bb & -bb
+        frm = lsb.bit_length() - 1
+        bb ^= lsb
+        one = frm + forward
+        promotes = one >> 3 == promo_row
+        if not (occupied >> one) & 1:
+            if promotes:
+                if noisy:
+                    for flags in PROMOTION_FLAGS:
+                        moves.append(frm | one << 6 | flags)
+            elif quiet:
+                moves.append(frm | one << 6)
+                if frm >> 3 == start_row:
+                    two = one + forward
+                    if not (occupied >> two) & 1:
+                        moves.append(frm | two << 6 | DOUBLE_PUSH << 12)
+        attacks = pawn_attacks_from[frm]
+        targets = attacks & enemy
+        while targets:
+            t = targets & -targets
+            to = t.bit_length() - 1
+            targets ^= t
+            if promotes:
+                for flags in PROMOTION_FLAGS:
+                    moves.append(frm | to << 6 | CAPTURE_BIT | flags)
             else:
-                if captured_pos == (0, 0):
-                    engine.castling_rights &= ~8
-                elif captured_pos == (0, 7):
-                    engine.castling_rights &= ~4
-
-    board.squares[initial.row][initial.col].piece = None
-    board.squares[final.row][final.col].piece = piece
-
-    if isinstance(piece, King) and abs(final.col - initial.col) == 2:
-        is_castle = True
-        if final.col > initial.col:
-            rook_from_col, rook_to_col = 7, 5
-        else:
-            rook_from_col, rook_to_col = 0, 3
-        rook_piece = board.squares[initial.row][rook_from_col].piece
-        rook_state = (rook_piece, rook_from_col, rook_to_col, rook_piece.moved)
-        board.squares[initial.row][rook_from_col].piece = None
-        board.squares[initial.row][rook_to_col].piece = rook_piece
-        rook_piece.moved = True
-        rook_idx = PIECE_INDEX[(rook_piece.colour, rook_piece.name)]
-        engine.current_hash ^= ZOBRIST_PIECES[rook_idx][initial.row * 8 + rook_from_col]
-        engine.current_hash ^= ZOBRIST_PIECES[rook_idx][initial.row * 8 + rook_to_col]
-        if piece.colour == 'white':
-            engine.castling_rights &= ~(1 | 2)
-        else:
-            engine.castling_rights &= ~(4 | 8)
-
-    if promotion and isinstance(piece, Pawn) and (final.row == 0 or final.row == 7):
-        promotion_piece = Queen(piece.colour)
-        board.squares[final.row][final.col].piece = promotion_piece
-        promo_idx = PIECE_INDEX[(promotion_piece.colour, promotion_piece.name)]
-        engine.current_hash ^= ZOBRIST_PIECES[piece_idx][final.row * 8 + final.col]
-        engine.current_hash ^= ZOBRIST_PIECES[promo_idx][final.row * 8 + final.col]
-    else:
-        engine.current_hash ^= ZOBRIST_PIECES[piece_idx][final.row * 8 + final.col]
-
-    prev_ep_flags = []
-    for r in range(ROWS):
-        for c in range(COLS):
-            p = board.squares[r][c].piece
-            if isinstance(p, Pawn) and p.en_passant:
-                prev_ep_flags.append((r, c))
-    clear_en_passant(board)
-    if prev_ep is not None:
-        engine.current_hash ^= ZOBRIST_EP[prev_ep]
-    engine.ep_file = None
-    if isinstance(piece, Pawn) and abs(final.row - initial.row) == 2:
-        piece.en_passant = True
-        engine.ep_file = final.col
-        engine.current_hash ^= ZOBRIST_EP[engine.ep_file]
-
-    piece.moved = True
-    if isinstance(piece, King):
-        engine.king_pos[piece.colour] = (final.row, final.col)
-        if piece.colour == 'white':
-            engine.castling_rights &= ~(1 | 2)
-        else:
-            engine.castling_rights &= ~(4 | 8)
-    if isinstance(piece, Rook):
-        if piece.colour == 'white':
-            if initial.row == 7 and initial.col == 0:
-                engine.castling_rights &= ~2
-            elif initial.row == 7 and initial.col == 7:
-                engine.castling_rights &= ~1
-        else:
-            if initial.row == 0 and initial.col == 0:
-                engine.castling_rights &= ~8
-            elif initial.row == 0 and initial.col == 7:
-                engine.castling_rights &= ~4
-
-    engine.current_hash ^= ZOBRIST_CASTLING[prev_castling]
-    engine.current_hash ^= ZOBRIST_CASTLING[engine.castling_rights]
-
-    board.last_move = move
-    engine.current_hash ^= ZOBRIST_SIDE
-
-    undo = {
-        'captured': captured_piece,
-        'captured_pos': captured_pos,
-        'is_en_passant': is_en_passant,
-        'is_castle': is_castle,
-        'rook_state': rook_state,
-        'promotion_piece': promotion_piece,
-        'piece': piece,
-        'piece_moved_prev': piece_moved_prev,
-        'prev_ep': prev_ep_flags,
-        'prev_ep_file': prev_ep,
-        'prev_castling': prev_castling,
-        'prev_last': prev_last,
-        'prev_hash': prev_hash,
-    }
-    return undo, engine.current_hash
-
-
-def undo_move(board, move, undo):
-    initial = move.initial
-    final = move.final
-    piece = undo['piece']
+                moves.append(frm | to << 6 | CAPTURE_BIT)
+        # en passant
+        if ep is not None and noisy and (attacks >> ep) & 1:
+            moves.append(frm | ep << 6 | EP_CAPTURE << 12)
+
+    for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+        bb = pieces[base + kind]
+        while bb:
+            lsb = bb & -bb
+            frm = lsb.bit_length() - 1
+            bb ^= lsb
+            if kind == KNIGHT:
+                attacks = KNIGHT_ATTACKS[frm]
+            elif kind == BISHOP:
+                attacks = bishop_attacks(frm, occupied)
+            elif kind == ROOK:
+                attacks = rook_attacks(frm, occupied)
+            else:
+                attacks = queen_attacks(frm, occupied)
+            targets = attacks & enemy
+            while targets:
+                t = targets & -targets
+                moves.append(frm | (t.bit_length() - 1) << 6 | CAPTURE_BIT)
+                targets ^= t
+            targets = attacks & empty
+            while targets:
+                t = targets & -targets
+                moves.append(frm | (t.bit_length() - 1) << 6)
+                targets ^= t
+
+    king = pieces[base + KING]
+    if king:
+        frm = king.bit_length() - 1
+        attacks = KING_ATTACKS[frm]
+        targets = attacks & enemy
+        while targets:
+            t = targets & -targets
+            moves.append(frm | (t.bit_length() - 1) << 6 | CAPTURE_BIT)
+            targets ^= t
+        targets = attacks & empty
+        while targets:
+            t = targets & -targets
+            moves.append(frm | (t.bit_length() - 1) << 6)
+            targets ^= t
+        # castling
+        rights = engine.castling_rights & (3 if colour == WHITE else 12) if quiet else 0
+        if rights and not king_in_check(pos, colour):
+            enemy_colour = colour ^ 1
+            rooks = pieces[base + ROOK]
+            # king side
+            if rights & (1 | 4) and not (occupied >> (frm + 1)) & 3 and (rooks >> (frm + 3)) & 1:
+                if not square_attacked(pos, frm + 1, enemy_colour) and not square_attacked(pos, frm + 2, enemy_colour):
+                    moves.append(frm | (frm + 2) << 6 | KING_CASTLE << 12)
+            # queen side
+            if rights & (2 | 8) and not (occupied >> (frm - 3)) & 7 and (rooks >> (frm - 4)) & 1:
+                if not square_attacked(pos, frm - 1, enemy_colour) and not square_attacked(pos, frm - 2, enemy_colour):
+                    moves.append(frm | (frm - 2) << 6 | QUEEN_CASTLE << 12)
+    return moves
 
-    engine.current_hash = undo['prev_hash']
 
-    board.squares[initial.row][initial.col].piece = piece
-    board.squares[final.row][final.col].piece = None
+def is_pseudo_legal(pos, move, colour, engine=engine):
+    """
+    Whether generate_pseudo_moves would produce move in pos. Checks TT, PV and
+    killer moves, which may come from another position, without generating.
+    """
+    frm = move & 63
+    to = (move >> 6) & 63
+    flags = move >> 12
+    mailbox = pos.mailbox
+    code = mailbox[frm]
+    if code == EMPTY or code // 6 != colour:
+        return False
+    kind = code % 6
+    if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+        return kind == KING and move in generate_quiet_moves(pos, colour, engine)
+    if flags == EP_CAPTURE:
+        return kind == PAWN and to == engine.ep_square and bool((PAWN_ATTACKS[colour][frm] >> to) & 1)
+    target = mailbox[to]
+    if flags & CAPTURE:
+        if target == EMPTY or target // 6 == colour:
+            return False
+    elif target != EMPTY:
+        return False
+
+    if kind == PAWN:
+        if bool(flags & PROMOTION) != (to >> 3 == (0 if colour == WHITE else 7)):
+            return False
+        if flags & CAPTURE:
+            return bool((PAWN_ATTACKS[colour][frm] >> to) & 1)
+        forward = -8 if colour == WHITE else 8
+        if flags == DOUBLE_PUSH:
+            return (frm >> 3 == (6 if colour == WHITE else 1) and to == frm + 2 * forward
+                    and mailbox[frm + forward] == EMPTY)
+        return to == frm + forward
+    if flags & ~CAPTURE:
+        return False
+    if kind == KNIGHT:
+        attacks = KNIGHT_ATTACKS[frm]
+    elif kind == BISHOP:
+        attacks = bishop_attacks(frm, pos.occupied)
+    elif kind == ROOK:
+        attacks = rook_attacks(frm, pos.occupied)
+    elif kind == QUEEN:
+        attacks = queen_attacks(frm, pos.occupied)
+    else:
+        attacks = KING_ATTACKS[frm]
+    return bool((attacks >> to) & 1)
 
-    piece.moved = undo['piece_moved_prev']
 
-    if undo['promotion_piece']:
-        board.squares[initial.row][initial.col].piece = Pawn(piece.colour)
-        board.squares[initial.row][initial.col].piece.moved = undo['piece_moved_prev']
+def generate_legal_moves(pos, colour, engine=engine):
+    legal = []
+    for move in generate_pseudo_moves(pos, colour, engine):
+        make_move(pos, move, colour, engine)
+        if not king_in_check(pos, colour):
+            legal.append(move)
+        undo_move(pos, move, engine)
+    return legal
 
-    if undo['captured']:
-        r, c = undo['captured_pos']
-        board.squares[r][c].piece = undo['captured']
 
-    if undo['is_castle'] and undo['rook_state']:
-        rook_piece, rook_from_col, rook_to_col, rook_moved_prev = undo['rook_state']
-        board.squares[initial.row][rook_from_col].piece = rook_piece
-        board.squares[initial.row][rook_to_col].piece = None
-        rook_piece.moved = rook_moved_prev
+def get_legal_moves(pos, colour, engine=engine):
+    """
+    Legal moves of colour in pos, cached per position.
+
+    This is the move list shared by the search and the UI board. The cache is
+    keyed by the engine's Zobrist hash, which also covers side to move,
+    castling rights and the en passant file; the returned tuple must not be
+    modified.
+    """
+    cache = engine.legal_cache
+    moves = cache.get(engine.current_hash)
+    if moves is None:
+        moves = tuple(generate_legal_moves(pos, colour, engine))
+        if len(cache) >= LEGAL_CACHE_SIZE:
+            cache.clear()
+        cache[engine.current_hash] = moves
+    return moves
 
-    if isinstance(piece, King):
-        engine.king_pos[piece.colour] = (initial.row, initial.col)
+# ---------------------------------------------------------------------------
+# Make / unmake with incremental hash
+# ---------------------------------------------------------------------------
 
-    clear_en_passant(board)
-    engine.ep_file = undo['prev_ep_file']
+def make_move(pos, move, colour, engine=engine):
+    frm = move & 63
+    to = (move >> 6) & 63
+    flags = move >> 12
 
-    for r, c in undo['prev_ep']:
-        p = board.squares[r][c].piece
-        if isinstance(p, Pawn):
-            p.en_passant = True
+    prev_hash = engine.current_hash
+    prev_castling = engine.castling_rights
+    prev_ep = engine.ep_square
+    prev_material = engine.material
+    prev_pst = engine.pst
+    h = prev_hash
+    pst = prev_pst
+
+    captured = EMPTY
+    captured_sq = to
+    if flags & CAPTURE:
+        if flags == EP_CAPTURE:
+            captured_sq = to + 8 if colour == WHITE else to - 8
+        captured = pos.remove(captured_sq)
+        h ^= ZOBRIST_PIECES[captured][captured_sq]
+        engine.material -= MATERIAL_SCORES[captured]
+        pst -= PST_SCORES[captured][captured_sq]
+        count_material(captured, -1, engine)
+
+    code = pos.remove(frm)
+    h ^= ZOBRIST_PIECES[code][frm]
+    if flags & PROMOTION:
+        placed = colour * 6 + (flags & 3) + KNIGHT
+        engine.material += MATERIAL_SCORES[placed] - MATERIAL_SCORES[code]
+        count_material(code, -1, engine)
+        count_material(placed, 1, engine)
+    else:
+        placed = code
+    pos.put(to, placed)
+    h ^= ZOBRIST_PIECES[placed][to]
+    pst += PST_SCORES[placed][to] - PST_SCORES[code][frm]
+
+    if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+        if flags == KING_CASTLE:
+            rook_from, rook_to = frm + 3, frm + 1
+        else:
+            rook_from, rook_to = frm - 4, frm - 1
+        rook = pos.remove(rook_from)
+        pos.put(rook_to, rook)
+        h ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+        pst += PST_SCORES[rook][rook_to] - PST_SCORES[rook][rook_from]
+    engine.pst = pst
 
-    engine.castling_rights = undo['prev_castling']
+    if prev_ep is not None:
+        h ^= ZOBRIST_EP[prev_ep & 7]
+    engine.ep_square = None
+    if flags == DOUBLE_PUSH:
+        engine.ep_square = (frm + to) >> 1
+        h ^= ZOBRIST_EP[to & 7]
 
-    board.last_move = undo['prev_last']
+    rights = prev_castling & CASTLING_MASKS[frm] & CASTLING_MASKS[to]
+    engine.castling_rights = rights
+    h ^= ZOBRIST_CASTLING[prev_castling] ^ ZOBRIST_CASTLING[rights]
+
+    engine.current_hash = h ^ ZOBRIST_SIDE
+
+    record = engine.undo_stack[engine.undo_top]
+    engine.undo_top += 1
+    record[0] = captured
+    record[1] = captured_sq
+    record[2] = prev_ep
+    record[3] = prev_castling
+    record[4] = prev_hash
+    record[5] = prev_material
+    record[6] = prev_pst
+
+
+def undo_move(pos, move, engine=engine):
+    frm = move & 63
+    to = (move >> 6) & 63
+    flags = move >> 12
+
+    code = pos.remove(to)
+    if flags & PROMOTION:
+        count_material(code, -1, engine)
+        code = code // 6 * 6 + PAWN
+        count_material(code, 1, engine)
+    pos.put(frm, code)
+
+    if flags == KING_CASTLE:
+        pos.put(frm + 3, pos.remove(frm + 1))
+    elif flags == QUEEN_CASTLE:
+        pos.put(frm - 4, pos.remove(frm - 1))
+
+    engine.undo_top -= 1
+    captured, captured_sq, prev_ep, prev_castling, prev_hash, prev_material, prev_pst = engine.undo_stack[engine.undo_top]
+    if captured != EMPTY:
+        pos.put(captured_sq, captured)
+        count_material(captured, 1, engine)
+
+    engine.current_hash = prev_hash
+    engine.ep_square = prev_ep
+    engine.castling_rights = prev_castling
+    engine.material = prev_material
+    engine.pst = prev_pst
+
+
+def play_move(pos, move, colour, engine=engine):
+    """
+    Makes move for good, e.g. to replay a game: unlike make_move it keeps no
+    undo record, so any number of moves can be played.
+    """
+    make_move(pos, move, colour, engine)
+    engine.undo_top -= 1
 
 # ---------------------------------------------------------------------------
 # Move ordering helpers
 # ---------------------------------------------------------------------------
 
-def mvv_lva(board, move):
-    target = board.squares[move.final.row][move.final.col].piece
-    if target is None:
+def mvv_lva(pos, move):
+    if not move & CAPTURE_BIT:
         return 0
-    victim = PIECE_VALUES[target.name]
-    attacker_piece = board.squares[move.initial.row][move.initial.col].piece
-    attacker = PIECE_VALUES[attacker_piece.name]
+    target = pos.mailbox[(move >> 6) & 63]
+    victim = KIND_VALUES[target % 6] if target != EMPTY else KIND_VALUES[PAWN]  # en passant
+    attacker = KIND_VALUES[pos.mailbox[move & 63] % 6]
     return victim * 10 - attacker
 
 
-def static_exchange_ok(board, move):
-    target = board.squares[move.final.row][move.final.col].piece
-    if target is None:
-        return True
-    attacker_piece = board.squares[move.initial.row][move.initial.col].piece
-    attacker = PIECE_VALUES[attacker_piece.name]
-    victim = PIECE_VALUES[target.name]
-    return victim >= attacker - 50
-
-
-def order_moves(board, moves, tt_move, ply):
+def see(pos, move):
+    """
+    Static exchange evaluation: material won by the side playing a capture once
+    both sides have recaptured on its square for as long as it pays, least
+    valuable attacker first and sliders lined up behind others joining in.
+    """
+    frm = move & 63
+    to = (move >> 6) & 63
+    mailbox = pos.mailbox
+    pieces = pos.pieces
+    occupied = pos.occupied ^ (1 << frm)
+    target = mailbox[to]
+    if target == EMPTY:
+        # en passant: the captured pawn is behind the target square
+        occupied ^= 1 << (to + (8 if to >> 3 == 2 else -8))
+        gain = [KIND_VALUES[PAWN]]
+    else:
+        gain = [KIND_VALUES[target % 6]]
+    piece_value = KIND_VALUES[mailbox[frm] % 6]
+    promotion = move_promotion(move)
+    if promotion is not None:
+        gain[0] += KIND_VALUES[promotion] - KIND_VALUES[PAWN]
+        piece_value = KIND_VALUES[promotion]
+
+    diagonal = pieces[BISHOP] | pieces[QUEEN] | pieces[6 + BISHOP] | pieces[6 + QUEEN]
+    orthogonal = pieces[ROOK] | pieces[QUEEN] | pieces[6 + ROOK] | pieces[6 + QUEEN]
+    attackers = attackers_to(pos, to, occupied) & occupied
+    side = (mailbox[frm] // 6) ^ 1
+    while True:
+        # gain if side takes the piece now on the square
+        gain.append(piece_value - gain[-1])
+        if max(-gain[-2], gain[-1]) < 0:
+            break  # neither side wants to go on
+        own = attackers & pos.colours[side]
+        if not own:
+            break
+        base = side * 6
+        for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            bb = own & pieces[base + kind]
+            if bb:
+                break
+        occupied ^= bb & -bb
+        if kind in (PAWN, BISHOP, QUEEN):
+            attackers |= bishop_attacks(to, occupied) & diagonal
+        if kind in (ROOK, QUEEN):
+            attackers |= rook_attacks(to, occupied) & orthogonal
+        attackers &= occupied
+        piece_value = KIND_VALUES[kind]
+        side ^= 1
+
+    # the last entry is a capture nobody gets to make; fold the rest back up
+    for d in range(len(gain) - 2, 0, -1):
+        gain[d - 1] = -max(-gain[d - 1], gain[d])
+    return gain[0]
+
+
+def losing_capture(pos, move):
+    """Whether a capture loses material by SEE; taking something worth at least the attacker never does."""
+    mailbox = pos.mailbox
+    target = mailbox[(move >> 6) & 63]
+    if target != EMPTY and KIND_VALUES[target % 6] >= KIND_VALUES[mailbox[move & 63] % 6]:
+        return False
+    return see(pos, move) < 0
+
+
+def order_moves(pos, moves, tt_move, ply, pv_move=None, engine=engine):
     ordered = []
+    history = engine.history
     k1, k2 = engine.killers[ply]
-    for move, promo in moves:
-        key = encode_move(move, promo)
+    for move in moves:
         score = 0
-        if tt_move and key == tt_move:
+        if move == pv_move:
+            score = 2_000_000_000
+        elif tt_move and move == tt_move:
             score = 1_000_000_000
         else:
-            if board.squares[move.final.row][move.final.col].piece:
-                score = 500_000 + mvv_lva(board, move)
-            elif key == k1:
+            if move & CAPTURE_BIT:
+                # losing captures go after the quiet moves
+                score = mvv_lva(pos, move) + (-500_000 if losing_capture(pos, move) else 500_000)
+            elif move == k1:
                 score = 300_000
-            elif key == k2:
+            elif move == k2:
                 score = 250_000
             else:
-                score = engine.history.get(key, 0)
-        ordered.append((score, move, promo))
+                score = history[move & 0xFFF]
+        ordered.append((score, move))
     ordered.sort(key=lambda x: x[0], reverse=True)
-    return [(m, p) for _, m, p in ordered]
+    return [m for _, m in ordered]
+
+def pick_moves(pos, colour, tt_move, ply, pv_move=None, engine=engine):
+    """
+    Yields colour's pseudo-legal moves lazily in search order, so a cutoff
+    early on saves generating and scoring the rest:
+
+    1. the PV move and the TT move,
+    2. captures and promotions, most valuable victim / least valuable attacker
+       first, holding back captures that lose material by SEE,
+    3. the killer moves,
+    4. quiet moves by history score,
+    5. the losing captures.
+
+    Each stage is generated when the one before runs out and picked by
+    selection rather than sorted. Moves may leave the king in check; the
+    caller tests that when it plays them.
+    """
+    done = []
+    for move in (pv_move, tt_move):
+        if move and move not in done and is_pseudo_legal(pos, move, colour, engine):
+            done.append(move)
+            yield move
+
+    scored = []
+    for move in generate_noisy_moves(pos, colour, engine):
+        if move not in done:
+            score = mvv_lva(pos, move)
+            if move & PROMOTION_BIT:
+                score += KIND_VALUES[move_promotion(move)] * 10
+            scored.append((score, move))
+    losing = []
+    while scored:
+        move = _pick_best(scored)
+        if move & CAPTURE_BIT and losing_capture(pos, move):
+            losing.append(move)
+        else:
+            yield move
+
+    for move in engine.killers[ply]:
+        # killers are quiet moves from sibling positions
+        if (move and move not in done and not move & (CAPTURE_BIT | PROMOTION_BIT)
+                and is_pseudo_legal(pos, move, colour, engine)):
+            done.append(move)
+            yield move
+
+    history = engine.history
+    scored = [(history[move & 0xFFF], move) for move in generate_quiet_moves(pos, colour, engine)
+              if move not in done]
+    while scored:
+        yield _pick_best(scored)
+
+    yield from losing
+
+
+def _pick_best(scored):
+    """Removes and returns the move with the highest score from a list of (score, move) pairs."""
+    best = 0
+    for i in range(1, len(scored)):
+        if scored[i][0] > scored[best][0]:
+            best = i
+    move = scored[best][1]
+    scored[best] = scored[-1]
+    scored.pop()
+    return move
 
 # ---------------------------------------------------------------------------
 # Quiescence search
 # ---------------------------------------------------------------------------
 
-def quiescence(board, alpha, beta, colour, ply):
-    if engine.time_limit and (time.time() - engine.start_time) >= engine.time_limit:
+def quiescence(pos, alpha, beta, colour, ply, qdepth=0, engine=engine):
+    """Captures and checks only, qdepth plies below the main search, ply from the root."""
+    if engine.stopped or (engine.time_limit and (time.time() - engine.start_time) >= engine.time_limit):
         raise TimeoutError
-    if ply >= Q_DEPTH_LIMIT:
-        return alpha
 
     engine.nodes += 1
-    stand_pat = evaluate(board) * (1 if colour == 'white' else -1)
+    stand_pat = evaluate(pos, engine) * (1 if colour == WHITE else -1)
+    if qdepth >= Q_DEPTH_LIMIT or ply >= MAX_PLY - 1:
+        return stand_pat
     if stand_pat >= beta:
         engine.cutoffs += 1
         return beta
@@ -687,38 +1110,34 @@ def quiescence(board, alpha, beta, colour, ply):
         alpha = stand_pat
 
     captures = []
-    enemy = 'black' if colour == 'white' else 'white'
-    for move, promo in generate_pseudo_moves(board, colour):
-        target = board.squares[move.final.row][move.final.col].piece
-        is_capture = target is not None
-        if not is_capture:
-            if isinstance(board.squares[move.initial.row][move.initial.col].piece, Pawn) and move.initial.col != move.final.col:
-                side_piece = board.squares[move.initial.row][move.final.col].piece
-                if side_piece and isinstance(side_piece, Pawn) and side_piece.colour != colour and side_piece.en_passant:
-                    is_capture = True
-        if is_capture:
-            if not static_exchange_ok(board, move):
+    enemy = colour ^ 1
+    mailbox = pos.mailbox
+    info = check_info(pos, colour)
+    for move in generate_pseudo_moves(pos, colour, engine):
+        if move & CAPTURE_BIT:
+            # delta pruning: even winning the piece (and promoting) cannot reach alpha
+            victim = mailbox[(move >> 6) & 63]
+            gain = KIND_VALUES[victim % 6] if victim != EMPTY else KIND_VALUES[PAWN]
+            if move & PROMOTION_BIT:
+                gain += KIND_VALUES[move_promotion(move)] - KIND_VALUES[PAWN]
+            if stand_pat + gain + DELTA_MARGIN <= alpha:
+                engine.delta_prunes += 1
                 continue
-            captures.append((move, promo))
-        else:
-            undo_chk, new_hash_chk = make_move(board, move, promo, colour)
-            engine.current_hash = new_hash_chk
-            gives_check = king_in_check(board, enemy)
-            undo_move(board, move, undo_chk)
-            engine.current_hash = undo_chk['prev_hash']
-            if gives_check:
-                captures.append((move, promo))
-
-    for move, promo in captures:
-        undo, new_hash = make_move(board, move, promo, colour)
-        engine.current_hash = new_hash
-        if engine.time_limit and (time.time() - engine.start_time) >= engine.time_limit:
-            undo_move(board, move, undo)
-            engine.current_hash = undo['prev_hash']
-            raise TimeoutError
-        score = -quiescence(board, -beta, -alpha, enemy, ply + 1)
-        undo_move(board, move, undo)
-        engine.current_hash = undo['prev_hash']
+            if losing_capture(pos, move):
+                continue
+            captures.append(move)
+        elif gives_check(pos, move, colour, info, engine):
+            captures.append(move)
+
+    for move in captures:
+        make_move(pos, move, colour, engine)
+        if king_in_check(pos, colour):
+            undo_move(pos, move, engine)
+            continue
+        try:
+            score = -quiescence(pos, -beta, -alpha, enemy, ply + 1, qdepth + 1, engine)
+        finally:
+            undo_move(pos, move, engine)
 
         if score >= beta:
             engine.cutoffs += 1
@@ -731,10 +1150,11 @@ def quiescence(board, alpha, beta, colour, ply):
 # Negamax with alpha-beta and TT
 # ---------------------------------------------------------------------------
 
-def negamax(board, depth, alpha, beta, colour, ply):
-    if engine.time_limit and (time.time() - engine.start_time) >= engine.time_limit:
+def negamax(pos, depth, alpha, beta, colour, ply, engine=engine):
+    if engine.stopped or (engine.time_limit and (time.time() - engine.start_time) >= engine.time_limit):
         raise TimeoutError
     if engine.rep_counts.get(engine.current_hash, 0) >= 2:
+        engine.pv_length[ply] = 0
         return DRAW_SCORE, None  # repetition draw
 
     engine.rep_stack.append(engine.current_hash)
@@ -742,96 +1162,163 @@ def negamax(board, depth, alpha, beta, colour, ply):
 
     try:
         engine.nodes += 1
+        engine.pv_length[ply] = 0
         orig_alpha = alpha
 
-        tt_entry = engine.tt.get(engine.current_hash)
+        tt_entry = engine.tt.probe(engine.current_hash)
         tt_move_key = None
-        if tt_entry and tt_entry['depth'] >= depth:
-            engine.tt_hits += 1
-            tt_move_key = tt_entry['move']
-            flag = tt_entry['flag']
-            tt_score = tt_entry['score']
-            if flag == EXACT:
-                return tt_score, tt_move_key
-            elif flag == LOWERBOUND:
-                alpha = max(alpha, tt_score)
-            elif flag == UPPERBOUND:
-                beta = min(beta, tt_score)
-            if alpha >= beta:
-                engine.cutoffs += 1
-                return tt_score, tt_move_key
-        elif tt_entry:
-            tt_move_key = tt_entry['move']
-
-        if depth == 0:
-            return quiescence(board, alpha, beta, colour, ply), None
-
-        side_in_check = king_in_check(board, colour)
-
-        if depth >= 3 and not side_in_check and not material_is_low(board):
+        if tt_entry:
+            tt_depth, tt_score, flag, tt_move = tt_entry
+            tt_move_key = tt_move or None
+            # PV nodes (open window) search on so the line below them is recorded
+            if tt_depth >= depth and ply > 0 and beta - alpha == 1:
+                engine.tt_hits += 1
+                if flag == EXACT:
+                    return tt_score, tt_move_key
+                elif flag == LOWERBOUND:
+                    alpha = max(alpha, tt_score)
+                elif flag == UPPERBOUND:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    engine.cutoffs += 1
+                    return tt_score, tt_move_key
+
+        if depth == 0 or ply >= MAX_PLY - 1:
+            return quiescence(pos, alpha, beta, colour, ply, 0, engine), None
+
+        side_in_check = king_in_check(pos, colour)
+
+        # Frontier pruning, only in zero-window nodes away from mate scores.
+        futile = False
+        if depth <= 2 and ply > 0 and not side_in_check and beta - alpha == 1 and abs(alpha) < INF - MAX_PLY:
+            static_eval = evaluate(pos, engine) * (1 if colour == WHITE else -1)
+            if static_eval + RAZOR_MARGINS[depth] <= alpha:
+                score = quiescence(pos, alpha, beta, colour, ply, 0, engine)
+                if score <= alpha:
+                    engine.razor_cutoffs += 1
+                    return score, None
+            futile = static_eval + FUTILITY_MARGINS[depth] <= alpha
+
+        if depth >= 3 and ply > 0 and not side_in_check and not material_is_low(pos, engine):
             null_depth = depth - 1 - 2
+            prev_ep = engine.ep_square
+            if prev_ep is not None:
+                engine.current_hash ^= ZOBRIST_EP[prev_ep & 7]
+                engine.ep_square = None
             engine.current_hash ^= ZOBRIST_SIDE
+            follow_pv = engine.follow_pv
+            engine.follow_pv = False
             try:
-                null_score, _ = negamax(board, null_depth, -beta, -beta + 1, 'black' if colour == 'white' else 'white', ply + 1)
+                null_score, _ = negamax(pos, null_depth, -beta, -beta + 1, colour ^ 1, ply + 1, engine)
                 null_score = -null_score
             finally:
+                engine.follow_pv = follow_pv
                 engine.current_hash ^= ZOBRIST_SIDE
+                if prev_ep is not None:
+                    engine.current_hash ^= ZOBRIST_EP[prev_ep & 7]
+                    engine.ep_square = prev_ep
             if null_score >= beta:
                 engine.cutoffs += 1
                 return beta, None  # null-move cutoff
 
-        legal_moves = generate_legal_moves(board, colour)
-        if not legal_moves:
-            if king_in_check(board, colour):
-                return -INF + ply, None
-            return DRAW_SCORE, None
-
-        ordered_moves = order_moves(board, legal_moves, tt_move_key, ply)
+        pv_move = None
+        if engine.follow_pv:
+            if ply < len(engine.pv):
+                pv_move = engine.pv[ply]
+            else:
+                engine.follow_pv = False
+        root_moves = engine.root_moves if ply == 0 else None
 
         best_move_key = None
         best_score = -INF
-
-        for move, promo in ordered_moves:
-            undo, new_hash = make_move(board, move, promo, colour)
-            engine.current_hash = new_hash
+        history = engine.history
+        killers = engine.killers[ply]
+        may_reduce = engine.use_lmr and depth >= LMR_MIN_DEPTH and not side_in_check
+        info = check_info(pos, colour) if futile else None
+        searched = 0
+
+        for move in pick_moves(pos, colour, tt_move_key, ply, pv_move, engine):
+            if move != pv_move:
+                # only the first move of a node on the previous PV stays on it
+                engine.follow_pv = False
+            if root_moves is not None and move not in root_moves:
+                continue
+            if (futile and searched and not move & (CAPTURE_BIT | PROMOTION_BIT)
+                    and not gives_check(pos, move, colour, info, engine)):
+                engine.futility_prunes += 1
+                continue
+            make_move(pos, move, colour, engine)
+            if king_in_check(pos, colour):
+                undo_move(pos, move, engine)
+                continue
+            searched += 1
             try:
-                score, _ = negamax(board, depth - 1, -beta, -alpha, 'black' if colour == 'white' else 'white', ply + 1)
-                score = -score
-            except TimeoutError:
-                undo_move(board, move, undo)
-                engine.current_hash = undo['prev_hash']
-                raise
-            undo_move(board, move, undo)
-            engine.current_hash = undo['prev_hash']
+                if searched == 1:
+                    score, _ = negamax(pos, depth - 1, -beta, -alpha, colour ^ 1, ply + 1, engine)
+                    score = -score
+                else:
+                    # after the first move, try to prove each move is no better (zero window)
+                    # and only search it properly when it is
+                    window = alpha + 1 if engine.use_pvs else beta
+                    reduction = 0
+                    if (may_reduce and searched > LMR_FULL_MOVES
+                            and not move & (CAPTURE_BIT | PROMOTION_BIT)
+                            and move not in killers
+                            and not king_in_check(pos, colour ^ 1)):
+                        reduction = 2 if searched > LMR_LATE_MOVES and not history[move & 0xFFF] else 1
+                        reduction = min(reduction, depth - 2)
+                        engine.lmr_reductions += 1
+                    if window != beta:
+                        engine.pvs_searches += 1
+                    score, _ = negamax(pos, depth - 1 - reduction, -window, -alpha, colour ^ 1, ply + 1, engine)
+                    score = -score
+                    if reduction and score > alpha:
+                        engine.lmr_researches += 1
+                        score, _ = negamax(pos, depth - 1, -window, -alpha, colour ^ 1, ply + 1, engine)
+                        score = -score
+                    if window != beta and alpha < score < beta:
+                        engine.pvs_researches += 1
+                        score, _ = negamax(pos, depth - 1, -beta, -alpha, colour ^ 1, ply + 1, engine)
+                        score = -score
+            finally:
+                undo_move(pos, move, engine)
 
             if score > best_score:
                 best_score = score
-                best_move_key = encode_move(move, promo)
+                best_move_key = move
             if score > alpha:
                 alpha = score
+                pv_table = engine.pv_table
+                child_length = engine.pv_length[ply + 1]
+                pv_table[ply][0] = move
+                pv_table[ply][1:child_length + 1] = pv_table[ply + 1][:child_length]
+                engine.pv_length[ply] = child_length + 1
             if alpha >= beta:
                 engine.cutoffs += 1
-                if board.squares[move.final.row][move.final.col].piece is None:
+                if not move & CAPTURE_BIT:
                     k1, k2 = engine.killers[ply]
-                    key = encode_move(move, promo)
-                    if k1 != key:
+                    if k1 != move:
                         engine.killers[ply][1] = k1
-                        engine.killers[ply][0] = key
-                    engine.history[key] = engine.history.get(key, 0) + depth * depth
+                        engine.killers[ply][0] = move
+                    engine.history[move & 0xFFF] += depth * depth
                 break
 
+        if not searched:
+            # no legal move (futility only prunes once one has been searched)
+            if side_in_check:
+                return -INF + ply, None
+            return DRAW_SCORE, None
+
         flag = EXACT
         if best_score <= orig_alpha:
             flag = UPPERBOUND
         elif best_score >= beta:
             flag = LOWERBOUND
 
-        engine.tt[engine.current_hash] = {
-            'depth': depth,
-            'score': best_score,
-            'flag': flag,
-            'move': best_move_key,
-        }
+        # a root split searched only some of the root moves, which says nothing
+        # reliable about the root position itself
+        if ply > 0 or engine.root_moves is None:
+            engine.tt.store(engine.current_hash, depth, best_score, flag, best_move_key or 0)
 
         return best_score, best_move_key
     finally:
@@ -848,36 +1335,59 @@ def negamax(board, depth, alpha, beta, colour, ply):
 # ---------------------------------------------------------------------------
 
 def decode_move(board, key):
-    if key is None:
+    if not key:
         return None
-    r1, c1, r2, c2, promo = key
-    move = Move(Square(r1, c1), Square(r2, c2))
-    return move, promo
-
-
-def get_best_move_optimized(board, depth=5, maximizing_player=True, time_limit=None, verbose=False):
-    colour = 'black' if maximizing_player else 'white'
-    start_hash = initial_hash(board)
-    engine.reset(start_hash, time_limit=time_limit)
-    engine.current_hash = start_hash
-    if colour == 'black':
-        engine.current_hash ^= ZOBRIST_SIDE
-
-    best_move_key = None
-    best_score = -INF
+    frm = key & 63
+    to = (key >> 6) & 63
+    promo = move_promotion(key)
+    promotion = PIECE_NAMES[promo] if promo is not None else None
+    move = Move(Square(frm // 8, frm % 8), Square(to // 8, to % 8), promotion)
+    return move, promotion
+
+
+def move_to_uci(move):
+    """Long algebraic notation of a move, e.g. e2e4 or e7e8q."""
+    text = square_name(move & 63) + square_name((move >> 6) & 63)
+    promo = move_promotion(move)
+    if promo is not None:
+        text += 'nbrq'[promo - KNIGHT]
+    return text
+
+
+def parse_uci_move(pos, colour, text, engine=engine):
+    """The legal move written as text in long algebraic notation; raises ValueError if there is none."""
+    for move in generate_legal_moves(pos, colour, engine):
+        if move_to_uci(move) == text:
+            return move
+    raise ValueError(f'illegal move {text!r}')
+
+
+def iterative_deepening(pos, colour, depth, verbose=False, on_iteration=None, engine=engine):
+    """
+    Searches pos to increasing depths until depth or the time limit is reached.
+
+    Returns a list of ``(depth, score, move)`` for every completed iteration
+    that produced a move; on_iteration, if given, is called with each of them
+    as soon as the iteration completes. The first iteration ignores the time
+    limit, so there is a searched move however little time was given; only
+    stop_search cuts it short.
+    """
+    results = []
     prev_score = 0
+    time_limit = engine.time_limit
+    engine.time_limit = None
 
     try:
         for d in range(1, depth + 1):
+            if d == 2:
+                engine.time_limit = time_limit
             window = 50
             alpha_w = prev_score - window if d > 1 else -INF
             beta_w = prev_score + window if d > 1 else INF
             widened = False
             while True:
-                try:
-                    score, mv_key = negamax(board, d, alpha_w, beta_w, colour, 0)
-                except TimeoutError:
-                    raise
+                engine.follow_pv = True
+                score, mv_key = negamax(pos, d, alpha_w, beta_w, colour, 0, engine)
                 if score <= alpha_w and not widened:
                     alpha_w = -INF
                     beta_w = INF
@@ -891,31 +1401,187 @@ def get_best_move_optimized(board, depth=5, maximizing_player=True, time_limit=N
                 break
 
             if mv_key:
-                best_move_key = mv_key
-                best_score = score
+                results.append((d, score, mv_key))
                 prev_score = score
+                engine.pv = engine.pv_table[0][:engine.pv_length[0]]
+                if not engine.pv or engine.pv[0] != mv_key:
+                    engine.pv = [mv_key]
+                if on_iteration:
+                    on_iteration(d, score, mv_key)
             if verbose:
                 elapsed = time.time() - engine.start_time
                 nps = engine.nodes / max(elapsed, 1e-3)
                 hit_rate = engine.tt_hits / max(engine.nodes, 1) * 100
-                print(f"Depth {d}: score {score:+} | nodes {engine.nodes} | nps {nps:,.0f} | tt {hit_rate:.1f}% | cut {engine.cutoffs}")
+                pv = ' '.join(move_to_uci(m) for m in engine.pv)
+                print(f"Depth {d}: score {score:+} | nodes {engine.nodes} | nps {nps:,.0f} | tt {hit_rate:.1f}% | "
+                      f"cut {engine.cutoffs} | pv {pv}")
     except TimeoutError:
         if verbose:
             print("Search stopped on time limit")
+    finally:
+        engine.time_limit = time_limit
+    return results
+
+
+def search_position(pos, colour, depth, time_limit=None, verbose=False, workers=1, on_iteration=None,
+                    engine=engine):
+    """
+    Searches pos, already loaded into the engine state, and returns the best
+    move key or None. on_iteration is only called by single-process searches.
+    """
+    if workers > 1:
+        return parallel_search(pos, colour, depth, time_limit, workers, verbose, engine=engine)
+    results = iterative_deepening(pos, colour, depth, verbose, on_iteration, engine=engine)
+    return results[-1][2] if results else None
+
+
+def get_best_move_optimized(board, depth=5, maximizing_player=True, time_limit=None, verbose=False, workers=1,
+                            engine=engine):
+    colour = BLACK if maximizing_player else WHITE
+    engine.reset(time_limit=time_limit)
+    engine.tt.new_search()
+    pos = load_board(board, colour, engine)
+    best_move_key = search_position(pos, colour, depth, time_limit, verbose, workers, engine=engine)
 
     move = decode_move(board, best_move_key)
     if move is None:
         return None
-    move_obj, promo = move
+    move_obj, _ = move
     piece = board.squares[move_obj.initial.row][move_obj.initial.col].piece
     return (piece, (move_obj.initial.row, move_obj.initial.col), move_obj)
 
+# ---------------------------------------------------------------------------
+# Parallel root splitting
+# ---------------------------------------------------------------------------
+# The GIL rules out threads, so the root moves are dealt round-robin to a pool
+# of worker processes. Each worker runs its own iterative deepening (with its
+# own TT) over its share of the root moves, and the parent keeps the best move
+# of the deepest iteration every worker completed. Workers search the module
+# engine, set up from the caller's engine by worker_settings/apply_settings.
+_pool = None
+_pool_size = 0
+
+
+def get_pool(workers):
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        close_pool()
+        # imported on first use: it adds more to the engine's import time than everything else
+        import multiprocessing
+        _pool = multiprocessing.Pool(workers)
+        _pool_size = workers
+    return _pool
+
+
+def close_pool():
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+    _pool = None
+    _pool_size = 0
+
+
+def worker_settings(engine=engine):
+    """
+    What a worker process needs from engine to search like it: the TT size
+    and file, the search feature switches and the repetition counts of the
+    game so far. Picklable; see apply_settings.
+    """
+    tt = engine.tt
+    tt_file = (tt.path, tt.readonly) if isinstance(tt, PersistentTranspositionTable) else None
+    return tt.size_mb, tt_file, engine.use_pvs, engine.use_lmr, dict(engine.rep_counts)
+
+
+def apply_settings(settings, engine=engine):
+    """Sets up engine from worker_settings; call after reset, which clears the repetition counts."""
+    size_mb, tt_file, engine.use_pvs, engine.use_lmr, rep_counts = settings
+    tt = engine.tt
+    persistent = isinstance(tt, PersistentTranspositionTable)
+    if tt_file is not None:
+        path, readonly = tt_file
+        if not persistent or (tt.path, tt.readonly, tt.size_mb) != (path, readonly, size_mb):
+            open_tt_file(path, size_mb, readonly, engine)
+    elif persistent:
+        tt.close()
+        engine.tt = TranspositionTable(size_mb)
+    elif tt.size_mb != size_mb:
+        tt.resize(size_mb)
+    engine.rep_counts = rep_counts
+
+
+def _search_worker(task):
+    pieces, castling_rights, ep_square, colour, depth, time_limit, root_moves, settings = task
+    engine.reset(time_limit=time_limit)
+    apply_settings(settings)
+    engine.tt.new_search()
+    pos = Position.from_pieces(pieces)
+    setup_position(pos, colour, castling_rights, ep_square)
+    engine.root_moves = root_moves
+    try:
+        results = iterative_deepening(pos, colour, depth)
+    finally:
+        engine.root_moves = None
+    return os.getpid(), engine.nodes, results, engine.pv
+
+
+def parallel_search(pos, colour, depth, time_limit, workers, verbose=False, engine=engine):
+    root_moves = order_moves(pos, get_legal_moves(pos, colour, engine), None, 0, engine=engine)
+    if not root_moves:
+        return None
+    shares = [root_moves[i::workers] for i in range(workers)]
+    settings = worker_settings(engine)
+    tasks = [
+        (pos.pieces, engine.castling_rights, engine.ep_square, colour, depth, time_limit, share, settings)
+        for share in shares if share
+    ]
+
+    outcomes = get_pool(workers).map(_search_worker, tasks)
+
+    engine.worker_nodes = [nodes for _, nodes, _, _ in outcomes]
+    engine.nodes = sum(engine.worker_nodes)
+    finished = [(results, pv) for _, _, results, pv in outcomes if results]
+    if not finished:
+        return None
+
+    # Scores are only comparable between workers at the same depth.
+    common_depth = min(results[-1][0] for results, _ in finished)
+    best_score, best_move_key = -INF, None
+    for results, pv in finished:
+        for d, score, move in results:
+            if d == common_depth and score > best_score:
+                best_score, best_move_key = score, move
+                # a worker's PV belongs to its last iteration, which may be deeper
+                engine.pv = pv if results[-1][0] == common_depth else [move]
+    if verbose:
+        elapsed = time.time() - engine.start_time
+        print(f"Depth {common_depth}: score {best_score:+} | nodes {engine.nodes} | "
+              f"nps {engine.nodes / max(elapsed, 1e-3):,.0f} | workers {len(tasks)}")
+    return best_move_key
+
+
+def stop_search(engine=engine):
+    """Asks a running search (e.g. on another thread) to return as soon as possible."""
+    engine.stopped = True
 
-def clear_transposition_table():
+
+def clear_transposition_table(engine=engine):
     engine.tt.clear()
 
 
-def get_stats():
+def open_tt_file(path, size_mb=DEFAULT_SIZE_MB, readonly=False, engine=engine):
+    """
+    Replaces the engine's transposition table with one kept in the file at
+    path, creating the file if needed; see PersistentTranspositionTable.
+    Worker processes started after this share the mapping of the module engine.
+    """
+    if isinstance(engine.tt, PersistentTranspositionTable):
+        engine.tt.close()
+    engine.tt = PersistentTranspositionTable(path, size_mb, ZOBRIST_SIGNATURE, readonly)
+    return engine.tt
+
+
+def get_stats(engine=engine):
     elapsed = time.time() - engine.start_time if engine.start_time else 0
     return {
         'nodes': engine.nodes,
@@ -923,4 +1589,13 @@ def get_stats():
         'tt_hit_rate': engine.tt_hits / max(engine.nodes, 1),
         'cutoffs': engine.cutoffs,
         'time': elapsed,
+        'worker_nodes': list(engine.worker_nodes),
+        'pv': [move_to_uci(move) for move in engine.pv],
+        'pvs_searches': engine.pvs_searches,
+        'pvs_researches': engine.pvs_researches,
+        'lmr_reductions': engine.lmr_reductions,
+        'lmr_researches': engine.lmr_researches,
+        'delta_prunes': engine.delta_prunes,
+        'futility_prunes': engine.futility_prunes,
+        'razor_cutoffs': engine.razor_cutoffs,
     }
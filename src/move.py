@@ -3,14 +3,16 @@ import math
 
 class Move:
 
-    def __init__(self, initial, final):
+    def __init__(self, initial, final, promotion=None):
         self.initial = initial
         self.final = final
+        # name of the piece a pawn promotes to; None means a queen
+        self.promotion = promotion
 
     def __str__(self):
         s = ''
-        s += f'{chr(ord('A') + self.initial.col)}{int(math.fabs(self.initial.row-8))}'
-        s += f'; {chr(ord('A') + self.final.col)}{int(math.fabs(self.final.row-8))}'
+        s += f'{chr(ord("A") + self.initial.col)}{int(math.fabs(self.initial.row-8))}'
+        s += f'; {chr(ord("A") + self.final.col)}{int(math.fabs(self.final.row-8))}'
         return s
 
     def __eq__(self, other):
@@ -0,0 +1,117 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+
+The counts for the reference positions below are known exactly, so any
+difference points at a bug in move generation or make/unmake, and the
+nodes per second measure the speed of both.
+
+    python src/perft.py 5
+    python src/perft.py 3 --fen "<fen>" --divide
+    python src/perft.py --suite --max-nodes 5000000
+"""
+import argparse
+import sys
+import time
+
+from bitboard import START_FEN
+from minimax import generate_legal_moves, make_move, undo_move, load_fen, move_to_uci
+
+# (name, FEN, node counts at depth 1, 2, ...)
+PERFT_SUITE = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(pos, colour, depth):
+    if depth == 0:
+        return 1
+    moves = generate_legal_moves(pos, colour)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        make_move(pos, move, colour)
+        nodes += perft(pos, colour ^ 1, depth - 1)
+        undo_move(pos, move)
+    return nodes
+
+
+def divide(pos, colour, depth):
+    """Returns ``(move, nodes)`` for every legal move, the perft of its subtree."""
+    results = []
+    for move in generate_legal_moves(pos, colour):
+        make_move(pos, move, colour)
+        results.append((move, perft(pos, colour ^ 1, depth - 1)))
+        undo_move(pos, move)
+    return results
+
+
+def run(fen, depth, show_divide=False):
+    pos, colour = load_fen(fen)
+    start = time.perf_counter()
+    if show_divide:
+        results = divide(pos, colour, depth)
+        for move, nodes in sorted(results, key=lambda r: move_to_uci(r[0])):
+            print(f'{move_to_uci(move)}: {nodes}')
+        nodes = sum(n for _, n in results)
+    else:
+        nodes = perft(pos, colour, depth)
+    elapsed = time.perf_counter() - start
+    print(f'depth {depth}: {nodes} nodes in {elapsed:.2f}s ({nodes / max(elapsed, 1e-6):,.0f} nps)')
+    return nodes
+
+
+def run_suite(max_nodes=200_000):
+    """
+    Checks every reference position at each depth whose count is at most
+    max_nodes. Returns True when all counts match.
+    """
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in PERFT_SUITE:
+        for depth, expected in enumerate(counts, 1):
+            if expected > max_nodes:
+                break
+            pos, colour = load_fen(fen)
+            start = time.perf_counter()
+            nodes = perft(pos, colour, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else f'FAIL (expected {expected})'
+            ok = ok and nodes == expected
+            print(f'{name:<12} depth {depth}: {nodes:>9} {status:<4} {nodes / max(elapsed, 1e-6):>10,.0f} nps')
+    print(f'total: {total_nodes} nodes in {total_time:.2f}s ({total_nodes / max(total_time, 1e-6):,.0f} nps)')
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move generator perft and benchmark.')
+    parser.add_argument('depth', type=int, nargs='?', default=4)
+    parser.add_argument('--fen', default=START_FEN, help='position to count from (default: start position)')
+    parser.add_argument('--divide', action='store_true', help='print the node count below every root move')
+    parser.add_argument('--suite', action='store_true', help='check all reference positions instead')
+    parser.add_argument('--max-nodes', type=int, default=200_000,
+                        help='with --suite, skip depths whose count exceeds this')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if run_suite(args.max_nodes) else 1
+    run(args.fen, args.depth, args.divide)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,13 @@
-import os
-import sys
-
-
 class Piece:
-    def __init__(self, name: str, colour: str, value: int, texture=None, texture_rect=None):
+    def __init__(self, name: str, colour: str, value: int, texture_rect=None):
         self.name = name
         self.colour = colour
         value_sign = 1 if colour == 'white' else -1
         self.value = value_sign * value
-        self.texture = texture
-        self.set_texture()
         self.texture_rect = texture_rect
         self.moves = []
         self.moved = False
 
-    def set_texture(self, size=80):
-        base = getattr(sys, '_MEIPASS', os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-        self.texture = os.path.join(
-            base,
-            f'assets/images/{size}px/{self.colour[0].upper()}{self.name.upper()}.png'
-        )
-
     def add_move(self, move):
         self.moves.append(move)
 
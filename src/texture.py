@@ -0,0 +1,33 @@
+import pygame
+
+from sound import asset_path
+
+COLOURS = ('white', 'black')
+NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+SIZES = (80, 120)
+
+
+class TextureCache:
+
+    def __init__(self):
+        self.surfaces = {}
+
+    def load(self):
+        """Decodes every piece image once; needs the display mode to be set."""
+        for colour in COLOURS:
+            for name in NAMES:
+                for size in SIZES:
+                    path = asset_path(f'assets/images/{size}px/{colour[0].upper()}{name.upper()}.png')
+                    img = pygame.image.load(path)
+                    if pygame.display.get_surface() is not None:
+                        img = img.convert_alpha()
+                    self.surfaces[(colour, name, size)] = img
+
+    def get(self, piece, size=80):
+        if not self.surfaces:
+            self.load()
+        return self.surfaces[(piece.colour, piece.name, size)]
+
+
+# shared by every Game, so a reset does not reload the images
+textures = TextureCache()
@@ -0,0 +1,211 @@
+import mmap
+import os
+import random
+import struct
+from array import array
+
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
+DEFAULT_SIZE_MB = 16
+
+# Every bucket holds two slots of two 64-bit words each: the position key xored
+# with the packed data word, then the data word. Slot 0 keeps the deepest result
+# seen for that bucket, slot 1 is always overwritten. The xor lets probe throw
+# out a slot whose two words were written by different stores, which can happen
+# when processes share a table file.
+SLOT_WORDS = 2
+BUCKET_WORDS = 2 * SLOT_WORDS
+BUCKET_BYTES = BUCKET_WORDS * 8
+
+# Data word layout, low bits first.
+MOVE_BITS, SCORE_BITS, DEPTH_BITS, FLAG_BITS, AGE_BITS = 16, 32, 8, 2, 6
+SCORE_SHIFT = MOVE_BITS
+DEPTH_SHIFT = SCORE_SHIFT + SCORE_BITS
+FLAG_SHIFT = DEPTH_SHIFT + DEPTH_BITS
+AGE_SHIFT = FLAG_SHIFT + FLAG_BITS
+MOVE_MASK = (1 << MOVE_BITS) - 1
+SCORE_MASK = (1 << SCORE_BITS) - 1
+DEPTH_MASK = (1 << DEPTH_BITS) - 1
+FLAG_MASK = (1 << FLAG_BITS) - 1
+AGE_MASK = (1 << AGE_BITS) - 1
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+
+# Table files start with a header: magic and format version, bucket count and
+# the signature of the Zobrist keys the entries were stored under.
+FILE_MAGIC = b'CEPYTT01'
+HEADER_FORMAT = '=8sQQ'
+HEADER_BYTES = 64
+
+
+def bucket_count(size_mb):
+    """Largest power-of-two number of buckets that fits in size_mb."""
+    buckets = 1
+    while buckets * 2 * BUCKET_BYTES <= size_mb * 1024 * 1024:
+        buckets *= 2
+    return buckets
+
+
+class TranspositionTable:
+    """
+    Fixed-capacity transposition table packed into an ``array('Q')``.
+
+    The table is sized in megabytes and rounded down to a power-of-two number of
+    buckets, so memory use is fixed per instance however long the search runs.
+    Keys are stored xored with a salt; ``clear`` draws a new salt, which makes
+    every stored entry unreachable without touching the buffer.
+
+    The buffer is only allocated by the first ``new_search`` (or ``resize``),
+    so creating a table is cheap for processes that never search. Until then
+    it holds a single bucket.
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        self._rng = random.Random()
+        self.size_mb = size_mb
+        self.mask = 0
+        self.table = array('Q', bytes(BUCKET_BYTES))
+        self.allocated = False
+        self.salt = 0
+        self.generation = 0
+        self.clear()
+
+    def resize(self, size_mb):
+        buckets = bucket_count(size_mb)
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        self.table = array('Q', bytes(buckets * BUCKET_BYTES))
+        self.allocated = True
+        self.clear()
+
+    def clear(self):
+        self.salt = self._rng.getrandbits(64)
+        self.generation = (self.generation + 1) & AGE_MASK
+
+    def new_search(self):
+        """Ages existing entries so the replacement policy favours fresh ones."""
+        if not self.allocated:
+            self.resize(self.size_mb)
+            return
+        self.generation = (self.generation + 1) & AGE_MASK
+
+    def probe(self, key):
+        """Returns ``(depth, score, flag, move)`` for key, or None on a miss."""
+        table = self.table
+        key ^= self.salt
+        i = (key & self.mask) * BUCKET_WORDS
+        data = table[i + 1]
+        if table[i] ^ data != key:
+            data = table[i + 3]
+            if table[i + 2] ^ data != key:
+                return None
+        return ((data >> DEPTH_SHIFT) & DEPTH_MASK,
+                ((data >> SCORE_SHIFT) & SCORE_MASK) - SCORE_OFFSET,
+                (data >> FLAG_SHIFT) & FLAG_MASK,
+                data & MOVE_MASK)
+
+    def store(self, key, depth, score, flag, move):
+        table = self.table
+        key ^= self.salt
+        i = (key & self.mask) * BUCKET_WORDS
+        data = (move
+                | (score + SCORE_OFFSET) << SCORE_SHIFT
+                | depth << DEPTH_SHIFT
+                | flag << FLAG_SHIFT
+                | self.generation << AGE_SHIFT)
+
+        stored = table[i + 1]
+        if (table[i] ^ stored == key
+                or depth >= (stored >> DEPTH_SHIFT) & DEPTH_MASK
+                or (stored >> AGE_SHIFT) != self.generation):
+            # Depth-preferred slot: same position, deeper result or stale entry.
+            table[i] = key ^ data
+            table[i + 1] = data
+        else:
+            table[i + 2] = key ^ data
+            table[i + 3] = data
+
+
+class PersistentTranspositionTable(TranspositionTable):
+    """
+    A TranspositionTable kept in a memory-mapped file, so searches start from
+    what earlier ones (in this or any other process) stored there.
+
+    Several processes can map the same file. Stores need no lock: a slot torn
+    by two concurrent writers fails the key check and reads as a miss.
+    Processes that should only consult the table open it with readonly=True.
+    Every process sharing a file must open it with the same size.
+
+    Entries are only meaningful under the Zobrist keys they were stored with,
+    so the header records ``signature``, which the caller derives from its
+    keys. Only a new or empty file is initialised: one whose signature or size
+    does not match is refused with ValueError, never overwritten. Keys are not
+    salted, and ``clear`` only ages the entries: a new game keeps what the file
+    has learned.
+    """
+
+    def __init__(self, path, size_mb=DEFAULT_SIZE_MB, signature=0, readonly=False):
+        self.path = path
+        self.signature = signature
+        self.readonly = readonly
+        self._file = None
+        self._map = None
+        self._view = None
+        super().__init__(size_mb)
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """
+        Maps the file for size_mb, initialising it if it is new or empty.
+
+        Raises ValueError if the file holds a table of another size or for
+        other keys; the table stays mapped as it was.
+        """
+        buckets = bucket_count(size_mb)
+        length = HEADER_BYTES + buckets * BUCKET_BYTES
+        header = struct.pack(HEADER_FORMAT, FILE_MAGIC, buckets, self.signature).ljust(HEADER_BYTES, b'\0')
+        if self.readonly:
+            file = open(self.path, 'rb')
+        else:
+            file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+        file_size = os.fstat(file.fileno()).st_size
+        if file_size or self.readonly:
+            if file.read(HEADER_BYTES) != header or file_size != length:
+                file.close()
+                raise ValueError(f'{self.path} is not a transposition table of {size_mb} MB for these keys')
+        else:
+            file.truncate(length)
+            file.write(header)
+            file.flush()
+        self.close()
+        self._file = file
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self._map = mmap.mmap(self._file.fileno(), length, access=access)
+        self._view = memoryview(self._map)
+        self.table = self._view[HEADER_BYTES:].cast('Q')
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        self.allocated = True
+
+    def clear(self):
+        self.generation = (self.generation + 1) & AGE_MASK
+
+    def store(self, key, depth, score, flag, move):
+        if not self.readonly:
+            super().store(key, depth, score, flag, move)
+
+    def flush(self):
+        """Writes the table back to the file now rather than when the system gets to it."""
+        if self._map is not None and not self.readonly:
+            self._map.flush()
+
+    def close(self):
+        """Unmaps the file. The table holds a single empty bucket until resize maps it again."""
+        if self._map is not None:
+            self.table.release()
+            self._view.release()
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._map = self._view = None
+        self.table = array('Q', bytes(BUCKET_BYTES))
+        self.mask = 0
+        self.allocated = False
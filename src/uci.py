@@ -0,0 +1,268 @@
+"""
+UCI front-end: speaks the Universal Chess Interface on stdin/stdout so the
+engine can run under tournament managers and analysis GUIs. Only the engine
+modules are imported, never pygame.
+
+    python src/uci.py
+"""
+import sys
+import threading
+
+from bitboard import START_FEN
+from minimax import (
+    EngineState, INF, MAX_PLY, load_fen, play_move, parse_uci_move, move_to_uci, generate_legal_moves,
+    order_moves, search_position, stop_search, clear_transposition_table, open_tt_file, get_stats, get_pool,
+    close_pool,
+)
+from transposition import DEFAULT_SIZE_MB, TranspositionTable, PersistentTranspositionTable
+
+ENGINE_NAME = 'Chess-Engine-Python'
+ENGINE_AUTHOR = 'Granted07'
+MAX_DEPTH = 64
+MAX_THREADS = 64
+MAX_HASH_MB = 4096
+# Time kept back from every move for process and GUI overhead, in milliseconds.
+MOVE_OVERHEAD_MS = 50
+# Moves the remaining clock time is spread over when the GUI sends no movestogo.
+DEFAULT_MOVES_TO_GO = 30
+# Search time for a go that gives no depth, mate or clock limit, in milliseconds.
+DEFAULT_MOVETIME_MS = 5000
+# go parameters that take a number, and every keyword that ends a searchmoves list.
+GO_LIMITS = ('depth', 'mate', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo')
+GO_KEYWORDS = set(GO_LIMITS) | {'searchmoves', 'ponder', 'infinite'}
+
+
+def score_text(score):
+    """UCI score of a negamax score: mate in moves near +-INF, centipawns otherwise."""
+    if score >= INF - MAX_PLY:
+        return f'mate {max((INF - score + 1) // 2, 1)}'
+    if score <= -INF + MAX_PLY:
+        return f'mate -{max((INF + score) // 2, 1)}'
+    return f'cp {score}'
+
+
+def allot_time(params, colour):
+    """Seconds to spend on this move from the go parameters, or None for no limit."""
+    if 'movetime' in params:
+        return max(params['movetime'] - MOVE_OVERHEAD_MS, 10) / 1000
+    remaining = params.get('wtime' if colour == 0 else 'btime')
+    if remaining is None:
+        return None
+    increment = params.get('winc' if colour == 0 else 'binc', 0)
+    budget = remaining / params.get('movestogo', DEFAULT_MOVES_TO_GO) + increment * 3 // 4
+    budget = min(budget, remaining // 2) - MOVE_OVERHEAD_MS
+    return max(budget, 10) / 1000
+
+
+class UCI:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.fen = START_FEN
+        self.moves = []
+        self.workers = 1
+        self.engine = EngineState()
+        self.search_thread = None
+        # set by stop/quit; an infinite search holds its bestmove until then
+        self.stop_requested = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def loop(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+        close_pool()
+
+    def handle(self, line):
+        """Runs one command; returns False on quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {DEFAULT_SIZE_MB} min 1 max {MAX_HASH_MB}')
+            self.send(f'option name Threads type spin default 1 min 1 max {MAX_THREADS}')
+            self.send('option name HashFile type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            clear_transposition_table(self.engine)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, args):
+        # setoption name <id> [value <x>]
+        if 'name' not in args:
+            return
+        value_at = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:value_at]).lower()
+        value = ' '.join(args[value_at + 1:])
+        try:
+            if name == 'hash':
+                self.stop()
+                self.engine.tt.resize(min(max(int(value), 1), MAX_HASH_MB))
+            elif name == 'threads':
+                self.workers = min(max(int(value), 1), MAX_THREADS)
+                if self.workers > 1:
+                    # start the pool now: forking from the search thread while the main
+                    # thread blocks reading stdin leaves the children stuck on its lock
+                    get_pool(self.workers)
+            elif name == 'hashfile':
+                self.stop()
+                self.set_hash_file(value)
+        except ValueError as exc:
+            self.send(f'info string bad value for {name}: {value!r} ({exc})')
+        except OSError as exc:
+            self.send(f'info string {exc}')
+
+    def set_hash_file(self, path):
+        """Keeps the transposition table in the file at path, or back in memory for an empty path."""
+        tt = self.engine.tt
+        if path and path != '<empty>':
+            open_tt_file(path, tt.size_mb, engine=self.engine)
+            return
+        if isinstance(tt, PersistentTranspositionTable):
+            tt.close()
+            self.engine.tt = TranspositionTable(tt.size_mb)
+
+    def set_position(self, args):
+        # position [startpos | fen <fen>] [moves <move> ...]
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'fen':
+            fen = ' '.join(args[1:moves_at])
+        else:
+            fen = START_FEN
+        try:
+            self.load(fen, args[moves_at + 1:])
+        except ValueError as exc:
+            self.send(f'info string {exc}')
+            return
+        self.fen = fen
+        self.moves = args[moves_at + 1:]
+
+    def load(self, fen, moves):
+        """
+        Loads fen, plays moves and primes the repetition counts with the game so far.
+        Returns ``(pos, colour)``.
+        """
+        engine = self.engine
+        pos, colour = load_fen(fen, engine)
+        history = []
+        for text in moves:
+            history.append(engine.current_hash)
+            play_move(pos, parse_uci_move(pos, colour, text, engine), colour, engine)
+            colour ^= 1
+        for h in history:
+            # the root is counted by the search itself
+            if h != engine.current_hash:
+                engine.rep_counts[h] = engine.rep_counts.get(h, 0) + 1
+        return pos, colour
+
+    def go(self, args):
+        params = {}
+        search_moves = []
+        # only a bare go or go infinite searches until stop
+        infinite = not args
+        i = 0
+        while i < len(args):
+            if args[i] == 'infinite':
+                infinite = True
+            elif args[i] == 'searchmoves':
+                while i + 1 < len(args) and args[i + 1] not in GO_KEYWORDS:
+                    search_moves.append(args[i + 1])
+                    i += 1
+            elif args[i] in GO_LIMITS and i + 1 < len(args):
+                params[args[i]] = int(args[i + 1])
+                i += 1
+            i += 1
+        if 'mate' in params:
+            # a mate in n moves shows once the defender's reply to the nth move is searched
+            params['depth'] = min(params.get('depth', MAX_DEPTH), 2 * max(params['mate'], 1))
+
+        self.engine.reset()
+        self.engine.tt.new_search()
+        pos, colour = self.load(self.fen, self.moves)
+        root_moves = []
+        for text in search_moves:
+            try:
+                root_moves.append(parse_uci_move(pos, colour, text, self.engine))
+            except ValueError:
+                self.send(f'info string bad searchmoves move {text!r}')
+        self.engine.root_moves = root_moves or None
+        time_limit = None if infinite else allot_time(params, colour)
+        if not infinite and time_limit is None and 'depth' not in params:
+            # nodes, or no limit the engine understands: search for a fixed time
+            time_limit = DEFAULT_MOVETIME_MS / 1000
+        self.engine.time_limit = time_limit
+        depth = min(params.get('depth', MAX_DEPTH), MAX_DEPTH)
+        # stop cannot reach the worker processes, so an unbounded search stays in this
+        # one, and so does a searchmoves search, whose root split is already made
+        workers = self.workers if time_limit is not None or 'depth' in params else 1
+        if root_moves:
+            workers = 1
+
+        self.stop_requested.clear()
+        self.search_thread = threading.Thread(
+            target=self.search, args=(pos, colour, depth, time_limit, workers, infinite), daemon=True
+        )
+        self.search_thread.start()
+
+    def search(self, pos, colour, depth, time_limit, workers, infinite):
+        best = search_position(pos, colour, depth, time_limit, workers=workers, on_iteration=self.info,
+                               engine=self.engine)
+        if workers > 1 and best is not None:
+            stats = get_stats(self.engine)
+            self.send(f"info nodes {stats['nodes']} nps {int(stats['nps'])} time {int(stats['time'] * 1000)} "
+                      f"pv {' '.join(stats['pv'])}")
+        if infinite:
+            self.stop_requested.wait()
+        if best is None:
+            # stopped before the first iteration finished: play the TT move, or
+            # failing that whatever move ordering would have searched first
+            legal = self.engine.root_moves or generate_legal_moves(pos, colour, self.engine)
+            if legal:
+                entry = self.engine.tt.probe(self.engine.current_hash)
+                best = order_moves(pos, legal, entry[3] if entry else None, 0, engine=self.engine)[0]
+        self.send(f'bestmove {move_to_uci(best) if best is not None else "0000"}')
+
+    def info(self, depth, score, move):
+        stats = get_stats(self.engine)
+        self.send(f"info depth {depth} score {score_text(score)} nodes {stats['nodes']} "
+                  f"nps {int(stats['nps'])} time {int(stats['time'] * 1000)} pv {' '.join(stats['pv'])}")
+
+    def stop(self):
+        """Stops a running search and waits for its bestmove."""
+        if self.search_thread is None:
+            return
+        stop_search(self.engine)
+        self.stop_requested.set()
+        self.search_thread.join()
+        self.search_thread = None
+
+
+def main():
+    UCI().loop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+from analysis import position_board, position_fen
+from board import Board
+from move import Move
+from square import Square
+
+BLACK_TO_MOVE = 'r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 3 20'
+
+
+def test_set_fen_keeps_the_side_to_move():
+    board = Board()
+    assert board.set_fen(BLACK_TO_MOVE) == 'black'
+    assert position_board(board) == (board, 'black')
+    assert position_fen(board) == BLACK_TO_MOVE
+
+
+def test_side_to_move_follows_the_moves():
+    board = Board()
+    assert position_board(board)[1] == 'white'
+    pawn = board.squares[6][4].piece
+    move = Move(Square(6, 4), Square(4, 4))
+    board.calc_moves(pawn, 6, 4)
+    board.move(pawn, move)
+    assert position_board(board)[1] == 'black'
@@ -0,0 +1,56 @@
+import pytest
+
+from bitboard import START_FEN, parse_fen, to_fen, parse_square
+from minimax import EngineState, load_fen, get_legal_moves
+
+ROUND_TRIP = [
+    START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 3',
+    'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2',
+]
+
+
+@pytest.mark.parametrize('fen', ROUND_TRIP)
+def test_round_trip(fen):
+    assert to_fen(*parse_fen(fen)) == fen
+
+
+@pytest.mark.parametrize('fen', [
+    '',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq',
+    'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',
+    'rnbqkbnr/ppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'rnbq1bnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e9 0 1',
+])
+def test_malformed_fen_is_rejected(fen):
+    with pytest.raises(ValueError):
+        parse_fen(fen)
+
+
+@pytest.mark.parametrize('fen', [
+    # no pawn can have just double pushed to the square in front of e3
+    '4k3/8/8/8/8/8/3P4/4K3 w - e3 0 1',
+    # wrong rank for the side to move
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR w KQkq d3 0 3',
+    # the pushed pawn's start square is occupied
+    'rnbqkbnr/ppp1pppp/3p4/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2',
+])
+def test_impossible_en_passant_square_is_dropped(fen):
+    assert parse_fen(fen)[3] is None
+
+
+def test_impossible_en_passant_square_adds_no_moves():
+    engine = EngineState(1)
+    engine.reset()
+    pos, colour = load_fen('4k3/8/8/8/8/8/3P4/4K3 w - e3 0 1', engine)
+    assert engine.ep_square is None
+    assert len(get_legal_moves(pos, colour, engine)) == 6
+
+
+def test_en_passant_square_is_kept():
+    assert parse_fen(ROUND_TRIP[4])[3] == parse_square('d6')
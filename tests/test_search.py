@@ -0,0 +1,45 @@
+from minimax import EngineState, load_fen, get_legal_moves, iterative_deepening, parse_uci_move
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+
+def test_root_split_does_not_store_the_root():
+    engine = EngineState(1)
+    engine.reset()
+    engine.tt.new_search()
+    pos, colour = load_fen(MATE_IN_ONE, engine)
+    root_hash = engine.current_hash
+    mate = parse_uci_move(pos, colour, 'a1a8', engine)
+    # a worker's share of the root moves without the mate
+    engine.root_moves = [move for move in get_legal_moves(pos, colour, engine) if move != mate]
+
+    results = iterative_deepening(pos, colour, 3, engine=engine)
+
+    assert results and results[-1][2] != mate
+    assert engine.tt.probe(root_hash) is None
+
+
+def test_full_search_finds_mate_in_one():
+    engine = EngineState(1)
+    engine.reset()
+    engine.tt.new_search()
+    pos, colour = load_fen(MATE_IN_ONE, engine)
+    root_hash = engine.current_hash
+
+    results = iterative_deepening(pos, colour, 3, engine=engine)
+
+    assert results[-1][2] == parse_uci_move(pos, colour, 'a1a8', engine)
+    assert engine.tt.probe(root_hash) is not None
+
+
+def test_first_iteration_ignores_the_time_limit():
+    engine = EngineState(1)
+    engine.reset(time_limit=1e-6)
+    engine.tt.new_search()
+    pos, colour = load_fen(KIWIPETE, engine)
+
+    results = iterative_deepening(pos, colour, 3, engine=engine)
+
+    assert [d for d, _, _ in results] == [1]
+    assert engine.time_limit == 1e-6
@@ -0,0 +1,47 @@
+import pytest
+
+from transposition import PersistentTranspositionTable
+
+
+def test_file_keeps_its_entries(tmp_path):
+    path = tmp_path / 'tt.bin'
+    tt = PersistentTranspositionTable(str(path), 1, signature=7)
+    tt.store(12345, 3, 42, 0, 99)
+    tt.close()
+
+    tt = PersistentTranspositionTable(str(path), 1, signature=7, readonly=True)
+    assert tt.probe(12345) == (3, 42, 0, 99)
+    tt.close()
+
+
+def test_resize_refuses_a_file_made_for_another_size(tmp_path):
+    path = tmp_path / 'tt.bin'
+    tt = PersistentTranspositionTable(str(path), 1, signature=7)
+    tt.store(12345, 3, 42, 0, 99)
+    contents = path.read_bytes()
+
+    with pytest.raises(ValueError):
+        tt.resize(2)
+
+    # still mapped as before, and the file untouched
+    assert tt.size_mb == 1 and tt.probe(12345) == (3, 42, 0, 99)
+    tt.close()
+    assert path.read_bytes() == contents
+
+
+def test_open_refuses_a_file_for_other_keys(tmp_path):
+    path = tmp_path / 'tt.bin'
+    PersistentTranspositionTable(str(path), 1, signature=7).close()
+    contents = path.read_bytes()
+
+    with pytest.raises(ValueError):
+        PersistentTranspositionTable(str(path), 1, signature=8)
+    assert path.read_bytes() == contents
+
+
+def test_empty_file_is_initialised(tmp_path):
+    path = tmp_path / 'tt.bin'
+    path.write_bytes(b'')
+    tt = PersistentTranspositionTable(str(path), 1, signature=7)
+    assert tt.probe(12345) is None
+    tt.close()
@@ -0,0 +1,38 @@
+import io
+
+from uci import UCI, DEFAULT_MOVETIME_MS
+
+
+def run(*lines):
+    uci = UCI(output=io.StringIO())
+    for line in lines:
+        uci.handle(line)
+    if uci.search_thread is not None:
+        uci.search_thread.join()
+    return uci, uci.output.getvalue().splitlines()
+
+
+def test_go_mate_finds_the_mate():
+    _, output = run('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1', 'go mate 1')
+    assert output[-1] == 'bestmove a1a8'
+
+
+def test_go_searchmoves_only_plays_a_listed_move():
+    _, output = run('position startpos', 'go searchmoves a2a3 h2h4 depth 2')
+    assert output[-1] in ('bestmove a2a3', 'bestmove h2h4')
+
+
+def test_go_nodes_is_not_infinite():
+    uci = UCI(output=io.StringIO())
+    uci.handle('go nodes 1000')
+    assert uci.engine.time_limit == DEFAULT_MOVETIME_MS / 1000
+    uci.stop()
+
+
+def test_bare_go_is_infinite():
+    uci = UCI(output=io.StringIO())
+    uci.handle('go')
+    assert uci.engine.time_limit is None
+    assert uci.search_thread.is_alive()
+    uci.stop()
+    assert uci.output.getvalue().splitlines()[-1].startswith('bestmove ')